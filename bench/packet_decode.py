@@ -0,0 +1,93 @@
+"""
+Microbenchmark for NetController packet decoding.
+
+Compares the old list-based decoding path against the current one, which
+exposes strand payloads as uint8 views of the received datagram.
+
+Usage (from the repository root):
+
+    python -m bench.packet_decode [--strands N] [--pixels N] [--frames N]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from PyQt5 import QtCore
+
+from controllers.netcontroller import NetController
+
+
+def make_frame_packets(num_strands, pixels_per_strand):
+    """
+    Returns a list of datagrams making up one B/S/E frame
+    """
+    packets = [b'B']
+    for strand in range(num_strands):
+        datalen = pixels_per_strand * 3
+        payload = np.random.randint(0, 256, datalen, dtype=np.uint8)
+        header = bytes([ord('S'), strand, datalen & 0xFF, (datalen >> 8) & 0xFF])
+        packets.append(header + payload.tobytes())
+    packets.append(b'E')
+    return packets
+
+
+def legacy_decode(datagram, frame_data):
+    """
+    The decoding path NetController used before payload views were introduced
+    """
+    packet = [c for c in datagram]
+    cmd = chr(packet[0])
+    if cmd == 'S':
+        strand = packet[1]
+        frame_data[strand] = [c for c in packet[4:]]
+    elif cmd == 'E':
+        for strand, data in frame_data.items():
+            np.asarray(data).reshape((-1, 3))
+
+
+def current_decode(nc):
+    def decode(datagram, frame_data):
+        nc.process_packet(datagram)
+    return decode
+
+
+def run(decode, packets, num_frames):
+    frame_data = {}
+    start = time.perf_counter()
+    for _ in range(num_frames):
+        for datagram in packets:
+            decode(datagram, frame_data)
+    elapsed = time.perf_counter() - start
+    return (len(packets) * num_frames) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packet decoding benchmark")
+    parser.add_argument("--strands", type=int, default=32)
+    parser.add_argument("--pixels", type=int, default=160,
+                        help="Pixels per strand")
+    parser.add_argument("--frames", type=int, default=200)
+    args = parser.parse_args()
+
+    app = QtCore.QCoreApplication(["bench"])
+    nc = NetController(None, transport=None)
+    packets = make_frame_packets(args.strands, args.pixels)
+
+    def on_frame(frame):
+        for strand, data in frame.items():
+            np.asarray(data).reshape((-1, 3))
+    nc.new_frame.connect(on_frame)
+
+    before = run(legacy_decode, packets, args.frames)
+    after = run(current_decode(nc), packets, args.frames)
+
+    print("%d strands x %d pixels, %d frames" %
+          (args.strands, args.pixels, args.frames))
+    print("  legacy:  %10.0f packets/sec" % before)
+    print("  current: %10.0f packets/sec" % after)
+    print("  speedup: %10.1fx" % (after / before))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Benchmark suite for FireSim's hot paths.
+
+Builds a synthetic scene (see bench.scenes), times each benchmark and writes
+the results as JSON, so runs on different commits can be compared.
+
+Usage (from the repository root):
+
+    python -m bench.run [--strands N] [--groups N] [--pixels N]
+                        [--repeat N] [--only NAME,...] [--output results.json]
+                        [--compare baseline.json] [--threshold 1.2]
+
+With --compare, each benchmark is compared against a previous results file
+and the exit status is 1 if any got slower by more than --threshold.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import scipy
+
+from PyQt5 import QtCore
+from PyQt5.QtCore import QPointF
+
+from bench.scenes import make_scene, random_frame
+from controllers.canvascontroller import CanvasController
+from controllers.netcontroller import NetController
+from lib.buffer_utils import BufferUtils
+from lib.protocol import pack_frame
+from lib.raster import Rasterizer
+from models.canvas import Canvas
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """
+    Registers a benchmark.  The decorated function takes the run's arguments
+    and returns (fn, number, units): fn() is timed `number` times per repeat,
+    and units names what one call processes (for the rate in the results).
+    """
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+def measure(fn, number, repeat):
+    """
+    Returns the time per call, in seconds, of each of `repeat` runs of
+    `number` calls, after one untimed warmup call
+    """
+    fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+
+def summarize(times, units):
+    times = np.asarray(times)
+    best = float(times.min())
+    return {
+        "units": units,
+        "repeat": len(times),
+        "min": best,
+        "median": float(np.median(times)),
+        "mean": float(times.mean()),
+        "stdev": float(times.std()),
+        "per_sec": 0.0 if best == 0 else 1.0 / best,
+    }
+
+
+class IdentityView(object):
+    """
+    Stands in for CanvasView where a controller needs canvas <-> scene
+    transforms; canvas space is taken to be scene space
+    """
+
+    def canvas_to_scene(self, coord):
+        return coord
+
+    def scene_to_canvas(self, coord):
+        return coord
+
+
+def legacy_packets(frame):
+    packets = [b'B']
+    for strand, data in sorted(frame.items()):
+        n = len(data)
+        packets.append(bytes([ord('S'), strand, n & 0xFF, (n >> 8) & 0xFF]) +
+                       data.tobytes())
+    packets.append(b'E')
+    return packets
+
+
+def decode_benchmark(protocol):
+    def setup(args):
+        nc = NetController(None, transport=None)
+        frames = [random_frame(args.strands, args.groups * args.pixels, i)
+                  for i in range(16)]
+        if protocol == "legacy":
+            packets = [legacy_packets(frame) for frame in frames]
+        else:
+            packets = [pack_frame(i, frame) for i, frame in enumerate(frames)]
+        state = {"frame": 0}
+
+        def fn():
+            i = state["frame"] % len(packets)
+            state["frame"] += 1
+            # Frame IDs must keep increasing, so start over when they wrap
+            if i == 0:
+                nc.assembler.reset()
+            for packet in packets[i]:
+                nc.process_packet(packet)
+        return fn, 50, "frames"
+    return setup
+
+
+benchmark("process_packet_legacy")(decode_benchmark("legacy"))
+benchmark("process_packet_v1")(decode_benchmark("v1"))
+
+
+@benchmark("on_new_frame")
+def bench_on_new_frame(args):
+    scene = make_scene(args.strands, args.groups, args.pixels)
+    controller = CanvasController(IdentityView())
+    controller.model.scene = scene
+    frame = random_frame(args.strands, args.groups * args.pixels)
+    return (lambda: controller.on_new_frame(frame)), 100, "frames"
+
+
+@benchmark("gather_render_colors")
+def bench_gather(args):
+    scene = make_scene(args.strands, args.groups, args.pixels)
+    model = Canvas()
+    model.scene = scene
+    model.set_frame(random_frame(args.strands, args.groups * args.pixels))
+    out = np.zeros((len(model.render_index), 4), dtype=np.uint8)
+    return (lambda: model.gather_render_colors(out)), 100, "frames"
+
+
+@benchmark("scene_warmup")
+def bench_warmup(args):
+    scenes = []
+
+    def fn():
+        # Warmup fills caches, so each call needs a freshly loaded scene
+        if not scenes:
+            scenes.extend(make_scene(args.strands, args.groups, args.pixels)
+                          for _ in range(args.repeat + 1))
+        scenes.pop().warmup()
+    return fn, 1, "scenes"
+
+
+@benchmark("buffer_utils_init")
+def bench_buffer_utils(args):
+    scene = make_scene(args.strands, args.groups, args.pixels)
+    return (lambda: BufferUtils.init(scene)), 10, "scenes"
+
+
+@benchmark("get_objects_under_cursor")
+def bench_hit_test(args):
+    scene = make_scene(args.strands, args.groups, args.pixels)
+    controller = CanvasController(IdentityView())
+    controller.model.scene = scene
+    rng = np.random.RandomState(1)
+    points = [QPointF(x, y) for x, y in rng.uniform(0, 1000, (1000, 2))]
+
+    def fn():
+        for p in points:
+            controller.get_objects_under_cursor(p)
+    return fn, 1, "1000 lookups"
+
+
+def raster_benchmark(blurred):
+    def setup(args):
+        scene = make_scene(args.strands, args.groups, args.pixels)
+        model = Canvas()
+        model.scene = scene
+        model.set_frame(random_frame(args.strands, args.groups * args.pixels))
+        colors = model.gather_render_colors(
+            np.zeros((len(model.render_index), 4), dtype=np.uint8))
+        rasterizer = Rasterizer(scene.get_pixel_group_locations(),
+                                scene.extents, args.render_size, blurred)
+        image = np.zeros((rasterizer.height, rasterizer.width, 3),
+                         dtype=np.uint8)
+        return (lambda: rasterizer.render(colors, image)), 10, "frames"
+    return setup
+
+
+benchmark("offscreen_paint")(raster_benchmark(False))
+benchmark("offscreen_paint_blurred")(raster_benchmark(True))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change in each benchmark against a baseline results dict.
+    Returns the names of benchmarks that got slower than `threshold` times.
+    """
+    regressions = []
+    for name, result in sorted(results["results"].items()):
+        old = baseline.get("results", {}).get(name, None)
+        if old is None:
+            print("  %-28s (new)" % name)
+            continue
+        ratio = result["min"] / old["min"] if old["min"] > 0 else 0
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("  %-28s %8.3fx%s" % (name, ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FireSim benchmarks")
+    parser.add_argument("--strands", type=int, default=40)
+    parser.add_argument("--groups", type=int, default=10,
+                        help="Pixel groups per strand")
+    parser.add_argument("--pixels", type=int, default=50,
+                        help="Pixels per group")
+    parser.add_argument("--render-size", type=str, default="700x550")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", type=str, default=None,
+                        help="Comma-separated benchmark names to run")
+    parser.add_argument("--output", type=str, default=None,
+                        help="Write results to this JSON file")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="Compare against a previous results file")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Slowdown ratio counted as a regression")
+    args = parser.parse_args()
+    args.render_size = tuple(int(v) for v in args.render_size.split("x"))
+
+    app = QtCore.QCoreApplication(["bench"])
+
+    only = set(args.only.split(",")) if args.only else None
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+        },
+        "config": {
+            "strands": args.strands,
+            "groups": args.groups,
+            "pixels": args.pixels,
+            "total_pixels": args.strands * args.groups * args.pixels,
+            "render_size": list(args.render_size),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+
+    print("%d strands x %d groups x %d pixels (%d pixels)" %
+          (args.strands, args.groups, args.pixels,
+           results["config"]["total_pixels"]))
+    for name, setup in BENCHMARKS:
+        if only is not None and name not in only:
+            continue
+        fn, number, units = setup(args)
+        result = summarize(measure(fn, number, args.repeat), units)
+        results["results"][name] = result
+        print("  %-28s %10.3f ms  (%.1f %s/sec)" %
+              (name, result["min"] * 1000, result["per_sec"], units))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print("Compared to %s:" % args.compare)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
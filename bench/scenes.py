@@ -0,0 +1,79 @@
+"""
+Synthetic scenes for benchmarks.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from models.scene import Scene
+
+
+def make_scene_data(strands=8, groups=10, pixels=50, extents=(1000, 1000),
+                    seed=0):
+    """
+    Returns the JSON data for a scene with `groups` linear pixel groups of
+    `pixels` pixels on each of `strands` strands.  Groups are random line
+    segments, 20 to 200 units long; the same arguments always give the same
+    scene.
+    """
+    rng = np.random.RandomState(seed)
+    w, h = extents
+    pixel_groups = []
+    for strand in range(strands):
+        for group in range(groups):
+            start = rng.uniform((0, 0), (w, h))
+            angle = rng.uniform(0, 2 * np.pi)
+            length = rng.uniform(20, 200)
+            end = np.clip(start + length * np.array([np.cos(angle),
+                                                     np.sin(angle)]),
+                          0, (w, h))
+            pixel_groups.append({
+                "type": "linear",
+                "strand": strand,
+                "offset": group * pixels,
+                "count": pixels,
+                "start": [round(float(v), 1) for v in start],
+                "end": [round(float(v), 1) for v in end],
+            })
+
+    return {
+        "file-type": "scene",
+        "file-version": 2,
+        "scene-name": "Benchmark %dx%dx%d" % (strands, groups, pixels),
+        "bounding-box": list(extents),
+        "extents": list(extents),
+        "center": [w / 2, h / 2],
+        "strands": [{"id": strand, "enabled": True, "color-mode": "RGB8",
+                     "length": groups * pixels} for strand in range(strands)],
+        "pixel-groups": pixel_groups,
+        "backdrop-filename": "",
+        "backdrop-enable": False,
+    }
+
+
+def make_scene(strands=8, groups=10, pixels=50, extents=(1000, 1000), seed=0):
+    """
+    Writes a synthetic scene to a temporary file and loads it.  The file is
+    removed once loaded (the scene is never saved by the benchmarks).
+    """
+    data = make_scene_data(strands, groups, pixels, extents, seed)
+    fd, path = tempfile.mkstemp(suffix=".json", prefix="firesim-bench-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        scene = Scene(path)
+    finally:
+        os.remove(path)
+    scene.filepath = ""
+    return scene
+
+
+def random_frame(scene_strands, pixels_per_strand, seed=0):
+    """
+    Returns a frame (dict of strand number to RGB888 uint8 data)
+    """
+    rng = np.random.RandomState(seed)
+    return dict((strand, rng.randint(0, 256, pixels_per_strand * 3)
+                 .astype(np.uint8)) for strand in range(scene_strands))
@@ -1,4 +1,3 @@
-import numpy as np
 from copy import copy
 
 from PyQt5.QtCore import Qt, QObject, pyqtSlot, QPointF
@@ -8,7 +7,8 @@ from models.pixelgroup import *
 from models.canvas import Canvas
 
 from lib.dtypes import rgb888_color
-from lib.geometry import hit_test_rect, inflate_rect, vec2_sum
+from lib.geometry import inflate_rect, vec2_sum
+from lib.timing import timings
 
 
 class CanvasController(QObject):
@@ -35,9 +35,8 @@ class CanvasController(QObject):
 
     @pyqtSlot(dict)
     def on_new_frame(self, frame):
-        for strand, data in frame.items():
-            self.model.color_data[strand] =\
-                np.asarray(data).reshape((-1, 3))
+        with timings.span("assemble"):
+            self.model.set_frame(frame)
 
 
 # Adding pixel groups should actually be a toggle-able mode, not a single click.
@@ -54,10 +53,18 @@ class CanvasController(QObject):
                                                end=(vec2_sum(self.cursor_loc,
                                                              (50, 50))))
 
+    @pyqtSlot()
+    def delete_selected_groups(self):
+        for pg in self.selected.copy():
+            if pg in self.hovering:
+                self.hovering.remove(pg)
+            self.model.scene.remove_pixel_group(pg)
+        self.deselect_all()
+
     def try_select_under_cursor(self, pos):
         """
-        Right now this is done in a naive way.  There are more advanced
-        algorithms that could be put in place if performance is an issue.
+        Candidates come from the scene's spatial index (see
+        get_objects_under_cursor), so this stays cheap on large scenes.
         """
         mods = QGuiApplication.keyboardModifiers()
         add_selection = (mods == Qt.ControlModifier)
@@ -83,8 +90,7 @@ class CanvasController(QObject):
         """
         pos = self.view.canvas_to_scene((pos.x(), pos.y()))
 
-        candidates = [pg for pg in self.model.scene.pixel_groups
-                      if hit_test_rect(pg.bounding_box(), pos)]
+        candidates = self.model.scene.get_pixel_groups_at(pos)
 
         if len(candidates) == 0:
             return []
@@ -1,21 +1,65 @@
 from __future__ import division
 from past.utils import old_div
+import socket
+import threading
 import time
 import logging as log
+import numpy as np
 import zmq
 
 from PyQt5 import QtCore, QtNetwork
 
-USE_ZMQ = False
+from lib.capture import CaptureWriter
+from lib.frame_queue import FrameQueue
+from lib.net_metrics import NetMetrics
+from lib.protocol import FrameAssembler, ProtocolError, PROTOCOL_MAGIC
+from lib.timing import timings
+
+NET_PORT = 3020
+MAX_DATAGRAM_SIZE = 65535
+
+TRANSPORTS = ("udp", "zmq")
+ZMQ_ENDPOINT = "tcp://localhost:3020"
 
 
 class NetController(QtCore.QObject):
+    """
+    Receives frames from FireMix.
+
+    By default datagrams are read by a dedicated thread so that a slow paint
+    on the GUI thread can't stall the socket.  Complete frames are handed to
+    the GUI thread through a FrameQueue, and re-emitted there as new_frame.
+
+    The transport is either UDP on NET_PORT, or a ZeroMQ SUB socket connected
+    to `zmq_endpoint` (e.g. "ipc:///tmp/firesim" when FireMix runs on the same
+    machine).  Each ZeroMQ message is treated exactly like one UDP datagram.
+    With `transport` None there is no socket at all, and datagrams are only
+    fed in through process_packet() (by tests and benchmarks).
+    `zmq_hwm` sets the receive high-water mark, in messages.  `zmq_conflate`
+    keeps only the newest message, so it only makes sense when the sender
+    puts each whole frame into a single message.
+
+    Both the legacy B/S/E datagrams and the versioned protocol in lib.protocol
+    are accepted; they are told apart by the first byte of each datagram.
+
+    With `coalesce` set, complete frames are held back until flush_frame() is
+    called (by the view, just before it paints), and only the newest one is
+    emitted.  Frames replaced before they were shown are never converted, and
+    are counted in the frames_skipped metric.
+
+    Packet, frame and latency statistics are collected in `metrics`; use
+    get_metrics() for a snapshot including the queue and assembler counters.
+    """
 
     data_received = QtCore.pyqtSignal(list)
     start = QtCore.pyqtSignal()
     new_frame = QtCore.pyqtSignal(dict)
+    frame_ready = QtCore.pyqtSignal()
 
-    def __init__(self, app):
+    def __init__(self, app, threaded=True, queue_depth=2,
+                 drop_policy="drop-oldest", transport="udp",
+                 zmq_endpoint=ZMQ_ENDPOINT, zmq_hwm=1000, zmq_conflate=False,
+                 coalesce=False):
         super(NetController, self).__init__()
         self.context = None
         self.socket = None
@@ -24,7 +68,23 @@ class NetController(QtCore.QObject):
         self.in_frame = False
         self.running = True
 
-        self._frame_data = {}
+        # Spare frames for the assembler's partial frames, and for the frame
+        # held back in coalescing mode
+        self.frames = FrameQueue(queue_depth, drop_policy,
+                                 spare=FrameAssembler.MAX_PENDING +
+                                 (1 if coalesce else 0))
+        self.assembler = FrameAssembler(self.frames)
+        self._frame_data = self.frames.acquire()
+        self._displayed_frame = None
+        self._displayed_frame_painted = True
+        self.coalesce = coalesce
+        self._pending_frame = None
+
+        self.metrics = NetMetrics()
+        self._incomplete_frames = 0
+        self._metrics_timer = None
+        self._metrics_file = None
+        self._ingest_timing = timings.stats("ingest")
 
         self._frame_count = 0
         self._frame_time = time.perf_counter()
@@ -34,35 +94,172 @@ class NetController(QtCore.QObject):
         self._packet_time = time.perf_counter()
         self.pps = 0
 
-        if USE_ZMQ:
+        self._reader = None
+        self.recorder = None
+
+        self.frame_ready.connect(self.on_frame_ready)
+
+        if transport is not None and transport not in TRANSPORTS:
+            raise ValueError("transport must be one of %s" % ", ".join(TRANSPORTS))
+
+        if transport is None:
+            pass
+        elif transport == "zmq":
             self.context = zmq.Context()
             self.socket = self.context.socket(zmq.SUB)
-            self.socket.connect("tcp://localhost:3020")
+            # Socket options only apply to connections made after they are set
+            self.socket.setsockopt(zmq.RCVHWM, zmq_hwm)
+            if zmq_conflate:
+                self.socket.setsockopt(zmq.CONFLATE, 1)
+            self.socket.setsockopt(zmq.LINGER, 0)
             self.socket.setsockopt_string(zmq.SUBSCRIBE, u"")
-            self.start.connect(self.run)
+            self.socket.connect(zmq_endpoint)
+            # From here on the socket is only touched by the reader thread
+            self._reader = threading.Thread(target=self.zmq_read_loop,
+                                            name="NetController",
+                                            daemon=True)
+            self._reader.start()
+        elif threaded:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(("", NET_PORT))
+            # Lets the reader notice self.running going false
+            self.socket.settimeout(0.25)
+            self._recv_buffer = bytearray(MAX_DATAGRAM_SIZE)
+            self._reader = threading.Thread(target=self.read_loop,
+                                            name="NetController",
+                                            daemon=True)
+            self._reader.start()
         else:
             self.socket = QtNetwork.QUdpSocket(self)
             self.socket.readyRead.connect(self.read_datagrams)
-            self.socket.bind(3020, QtNetwork.QUdpSocket.ShareAddress | QtNetwork.QUdpSocket.ReuseAddressHint)
+            self.socket.bind(NET_PORT, QtNetwork.QUdpSocket.ShareAddress | QtNetwork.QUdpSocket.ReuseAddressHint)
+
+    @classmethod
+    def from_config(cls, app, config, args, scene, coalesce=None):
+        """
+        Creates a NetController with the net-* settings in `config`, and
+        starts metrics reporting and recording if `config` or the command
+        line `args` ask for them.  `coalesce` overrides net-coalesce-frames;
+        front-ends that never call flush_frame() must pass False.
+        """
+        if coalesce is None:
+            coalesce = config.get("net-coalesce-frames", True)
+        nc = cls(app,
+                 threaded=config.get("net-threaded", True),
+                 queue_depth=config.get("net-queue-depth", 2),
+                 drop_policy=config.get("net-drop-policy", "drop-oldest"),
+                 transport=config.get("net-transport", "udp"),
+                 zmq_endpoint=config.get("net-zmq-endpoint", ZMQ_ENDPOINT),
+                 zmq_hwm=config.get("net-zmq-hwm", 1000),
+                 zmq_conflate=config.get("net-zmq-conflate", False),
+                 coalesce=coalesce)
+
+        metrics_interval = (args.stats_interval
+                            if args.stats_interval is not None
+                            else config.get("net-metrics-interval", 0))
+        if metrics_interval > 0:
+            nc.start_metrics_report(metrics_interval,
+                                    config.get("net-metrics-file", None))
+
+        if args.record is not None:
+            nc.start_recording(CaptureWriter.for_scene(args.record, scene))
+        return nc
+
+    def stop(self):
+        self.running = False
+        if self._reader is not None:
+            self._reader.join()
+            self._reader = None
+        # The ZeroMQ reader closes its own socket; the UDP socket is closed
+        # here so that port 3020 can be bound again
+        if self.socket is not None and self.context is None:
+            self.socket.close()
+        self.socket = None
+        self.stop_recording()
+
+    def start_recording(self, writer):
+        """
+        Records every complete frame, as it is assembled, with `writer` (a
+        lib.capture.CaptureWriter).  This happens before coalescing, so frames
+        that are never shown are recorded too.
+        """
+        self.stop_recording()
+        self.recorder = writer
+
+    def stop_recording(self):
+        writer = self.recorder
+        if writer is not None:
+            self.recorder = None
+            writer.close()
+            log.info("Recorded %d frames to %s (%d dropped)" %
+                     (writer.frames_written, writer.path, writer.dropped))
+
+    def read_loop(self):
+        """
+        Ingest thread: reads every datagram into the same preallocated buffer.
+        process_packet copies strand payloads out into the frame being built,
+        so the buffer can be reused straight away.
+        """
+        buf = memoryview(self._recv_buffer)
+        while self.running:
+            try:
+                nbytes = self.socket.recv_into(self._recv_buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                if self.running:
+                    log.exception("Error reading from network socket")
+                break
+            self.packet_received(nbytes)
+            self.process_packet(buf[:nbytes])
+
+    def zmq_read_loop(self):
+        """
+        Ingest thread for the ZeroMQ transport.  Messages are received without
+        copying and decoded straight from ZeroMQ's buffer.
+        """
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        try:
+            while self.running:
+                # The timeout lets the reader notice self.running going false
+                if not poller.poll(250):
+                    continue
+                # Drain everything that is queued before polling again
+                while self.running:
+                    try:
+                        message = self.socket.recv(zmq.NOBLOCK, copy=False)
+                    except zmq.Again:
+                        break
+                    packet = message.buffer
+                    self.packet_received(len(packet))
+                    self.process_packet(packet)
+        except zmq.ZMQError:
+            if self.running:
+                log.exception("Error reading from ZeroMQ socket")
+        finally:
+            self.socket.close()
+            self.context.term()
 
     @QtCore.pyqtSlot()
     def read_datagrams(self):
         while self.socket.hasPendingDatagrams():
-            datagram = QtCore.QByteArray()
-            datagram.resize(self.socket.pendingDatagramSize())
-            (datagram, sender, sport) = self.socket.readDatagram(datagram.size())
-            # TODO(JE): is this the best way for Py2/Py3 compatability?
-            if type(datagram) is bytes:
-                packet = [c for c in datagram]
-            else:
-                packet = [ord(c) for c in datagram.data()]
-            self._packet_count += 1
-            delta = time.perf_counter() - self._packet_time
-            if delta > 1:
-                self.pps = 0 if delta == 0 else (self._packet_count / delta)
-                self._packet_count = 0
-                self._packet_time = time.perf_counter()
-            self.process_packet(packet)
+            # PyQt hands back the datagram as a single bytes object; everything
+            # downstream works on views of it rather than per-byte lists.
+            (datagram, sender, sport) = self.socket.readDatagram(
+                self.socket.pendingDatagramSize())
+            self.packet_received(len(datagram))
+            self.process_packet(datagram)
+
+    def packet_received(self, nbytes=0):
+        self.metrics.packet_received(nbytes)
+        self._packet_count += 1
+        delta = time.perf_counter() - self._packet_time
+        if delta > 1:
+            self.pps = 0 if delta == 0 else (self._packet_count / delta)
+            self._packet_count = 0
+            self._packet_time = time.perf_counter()
 
     def frame_started(self):
         self.in_frame = True
@@ -71,31 +268,177 @@ class NetController(QtCore.QObject):
     def frame_complete(self):
         self.in_frame = False
 
+    @QtCore.pyqtSlot()
+    def on_frame_ready(self):
+        """
+        Runs on the GUI thread: passes every queued frame on to new_frame, or
+        in coalescing mode keeps only the newest one until flush_frame().
+        """
+        while True:
+            frame = self.frames.take()
+            if frame is None:
+                break
+            if self.coalesce:
+                if self._pending_frame is not None:
+                    self.frames.release(self._pending_frame)
+                    self.metrics.frames_skipped += 1
+                self._pending_frame = frame
+            else:
+                self.show_frame(frame)
+
+    def flush_frame(self):
+        """
+        Emits the newest frame held back in coalescing mode, if there is one
+        """
+        frame = self._pending_frame
+        if frame is not None:
+            self._pending_frame = None
+            self.show_frame(frame)
+
+    def show_frame(self, frame):
+        """
+        The most recently emitted frame is kept out of the pool until the next
+        one replaces it, since receivers may hold on to its strand arrays.
+        """
+        self.frames.release(self._displayed_frame)
+        self._displayed_frame = frame
+        self._displayed_frame_painted = False
+        self.new_frame.emit(frame.strands)
+
+    def frame_painted(self):
+        """
+        Called by the view after each paint, to measure how long frames wait
+        between being completed and being shown
+        """
+        if not self._displayed_frame_painted:
+            self._displayed_frame_painted = True
+            self.metrics.frame_painted(self._displayed_frame.timestamp,
+                                       time.perf_counter())
+
+    def get_metrics(self):
+        """
+        Returns a JSON-serializable snapshot of all network metrics
+        """
+        m = self.metrics
+        m.frames_dropped = self.frames.dropped
+        m.frames_incomplete = self._incomplete_frames + self.assembler.incomplete
+        m.late_packets = self.assembler.late
+        m.duplicate_packets = self.assembler.duplicates
+        return m.snapshot()
+
+    def reset_metrics(self):
+        self.metrics.reset()
+        self.frames.reset_counters()
+        self.assembler.reset_counters()
+        self._incomplete_frames = 0
+
+    def start_metrics_report(self, interval, path=None):
+        """
+        Logs a metrics summary every `interval` seconds, and also writes the
+        full snapshot as JSON to `path` if one is given
+        """
+        self.stop_metrics_report()
+        self._metrics_file = path
+        self._metrics_timer = QtCore.QTimer(self)
+        self._metrics_timer.timeout.connect(self.report_metrics)
+        self._metrics_timer.start(int(interval * 1000))
+
+    def stop_metrics_report(self):
+        if self._metrics_timer is not None:
+            self._metrics_timer.stop()
+            self._metrics_timer = None
+
+    @QtCore.pyqtSlot()
+    def report_metrics(self):
+        self.get_metrics()
+        log.info("Net: %s" % self.metrics.summary())
+        if self._metrics_file is not None:
+            self.metrics.write_json(self._metrics_file)
+
     def process_packet(self, packet):
+        """
+        Decodes a single datagram.  `packet` may be any bytes-like object.
+        Strand payloads are read through uint8 views of it and copied once,
+        into the frame being assembled.  Datagrams in the versioned protocol
+        are identified by their first byte and handed to the FrameAssembler.
+        The time taken is recorded in the "ingest" timing span.
+        """
+        start = time.perf_counter()
+        try:
+            self._process_packet(packet)
+        finally:
+            self._ingest_timing.record(time.perf_counter() - start)
+
+    def _process_packet(self, packet):
+        if len(packet) == 0:
+            self.metrics.malformed_packets += 1
+            log.error("Malformed packet of length 0!")
+            return
+
         cmd = chr(packet[0])
         datalen = 0
 
+        # Versioned protocol
+        if cmd == PROTOCOL_MAGIC.decode():
+            try:
+                frame = self.assembler.process(
+                    packet, on_record=self.metrics.strand_received)
+            except ProtocolError as e:
+                self.metrics.malformed_packets += 1
+                log.error("Malformed packet: %s" % e)
+                return
+            if frame is not None:
+                self.publish_frame(frame)
+
         # Begin frame
-        if cmd == 'B':
+        elif cmd == 'B':
+            if self.in_frame:
+                # The previous frame never got its 'E'
+                self._incomplete_frames += 1
+                self._frame_data.clear()
             self.frame_started()
+            self._frame_data.started = time.perf_counter()
 
         # Unpack strand pixel data
         elif cmd == 'S':
+            if len(packet) < 4:
+                self.metrics.malformed_packets += 1
+                log.error("Malformed packet of length %d!" % len(packet))
+                return
             strand = packet[1]
+            self.metrics.strand_received(strand)
             datalen = (packet[3] << 8) + packet[2]
-            data = [c for c in packet[4:]]
-            self._frame_data[strand] = data
+            self._frame_data.set_strand(strand,
+                                        np.frombuffer(packet, dtype=np.uint8,
+                                                      offset=4))
 
         # End frame
         elif cmd == 'E':
-            self.new_frame.emit(self._frame_data)
-
-            self._frame_count += 1
-            delta = time.perf_counter() - self._frame_time
-            if delta > 1:
-                self.fps = 0 if delta == 0 else (self._frame_count / delta)
-                self._frame_count = 0
-                self._frame_time = time.perf_counter()
+            frame = self._frame_data
+            self._frame_data = self.frames.acquire()
+            self.frame_complete()
+            self.publish_frame(frame)
 
         else:
+            self.metrics.malformed_packets += 1
             log.error("Malformed packet of length %d!" % len(packet))
+
+    def publish_frame(self, frame):
+        """
+        Queues a complete frame for the GUI thread
+        """
+        frame.timestamp = time.perf_counter()
+        self.metrics.frame_completed(frame.started or frame.timestamp,
+                                     frame.timestamp)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.write_frame(frame.strands, frame.timestamp)
+        self.frames.publish(frame)
+        self.frame_ready.emit()
+
+        self._frame_count += 1
+        delta = time.perf_counter() - self._frame_time
+        if delta > 1:
+            self.fps = 0 if delta == 0 else (self._frame_count / delta)
+            self._frame_count = 0
+            self._frame_time = time.perf_counter()
@@ -0,0 +1,227 @@
+import threading
+import time
+import logging as log
+
+import numpy as np
+
+from PyQt5 import QtCore
+
+from lib.buffer_utils import BufferUtils
+from lib.net_metrics import Histogram
+
+# The scheduler waits on its condition until this long before a frame is
+# due, then sleeps out the rest, which is more precise
+SLEEP_TIME = 0.002
+
+
+class PlaybackController(QtCore.QObject):
+    """
+    Replays a capture file (see lib.capture) through new_frame, exactly as if
+    the frames were arriving from NetController.
+
+    Frames are scheduled by a background thread against time.perf_counter(),
+    from the recorded timestamps (or at a fixed `fps`, if given) divided by
+    `speed`.  Each due frame is handed to the GUI thread; if the GUI thread
+    falls behind, only the newest due frame is emitted and the rest are
+    counted in `skipped`.  How late each frame was emitted is recorded in the
+    `lateness` histogram.
+
+    The emitted strand arrays are views of the memory-mapped capture.
+    """
+
+    new_frame = QtCore.pyqtSignal(dict)
+    finished = QtCore.pyqtSignal()
+    frame_due = QtCore.pyqtSignal()
+
+    def __init__(self, capture, scene=None, speed=1.0, loop=False, fps=None):
+        super(PlaybackController, self).__init__()
+        self.capture = capture
+        self.loop = loop
+        self.fps = fps
+
+        if scene is not None:
+            if not capture.matches(scene):
+                log.warning("Capture %s was recorded with a different scene "
+                            "layout" % capture.path)
+            self._strand_offsets = BufferUtils.strand_offsets(scene)
+        else:
+            self._strand_offsets = [0, capture.pixel_count]
+
+        self.emitted = 0
+        self.skipped = 0
+        self.lateness = Histogram()
+
+        self._lock = threading.Condition()
+        self._speed = float(speed)
+        self._position = 0
+        self._playing = False
+        self._generation = 0
+        self._anchor_time = 0.0
+        self._anchor_media = 0.0
+        self._due_index = None
+        self._due_time = 0.0
+
+        self.running = True
+        self.frame_due.connect(self.on_frame_due)
+        self._scheduler = threading.Thread(target=self.schedule_loop,
+                                           name="PlaybackController",
+                                           daemon=True)
+        self._scheduler.start()
+
+    def media_time(self, index):
+        """
+        Returns the time of frame `index`, in seconds, at normal speed
+        """
+        if self.fps is not None:
+            return index / float(self.fps)
+        return float(self.capture.timestamps[index])
+
+    def duration(self):
+        if len(self.capture) == 0:
+            return 0.0
+        return self.media_time(len(self.capture) - 1)
+
+    def frame_interval(self):
+        """
+        Returns the gap to leave between the last frame and the first when
+        looping
+        """
+        n = len(self.capture)
+        if self.fps is not None or n < 2:
+            return 1.0 / (self.fps or 60.0)
+        return (self.media_time(n - 1) - self.media_time(0)) / (n - 1)
+
+    def _rebase(self, index, now=None):
+        # Called with the lock held: schedules frame `index` for `now`
+        self._position = index
+        self._anchor_time = time.perf_counter() if now is None else now
+        self._anchor_media = self.media_time(index) if len(self.capture) else 0
+        self._generation += 1
+        self._lock.notify_all()
+
+    def play(self):
+        with self._lock:
+            if not self._playing and len(self.capture) > 0:
+                self._playing = True
+                # Start again from the beginning after playing to the end
+                if self._position >= len(self.capture):
+                    self._position = 0
+                self._rebase(self._position)
+
+    def pause(self):
+        with self._lock:
+            self._playing = False
+            self._generation += 1
+            self._lock.notify_all()
+
+    @property
+    def playing(self):
+        return self._playing
+
+    @property
+    def position(self):
+        return self._position
+
+    @property
+    def speed(self):
+        return self._speed
+
+    @speed.setter
+    def speed(self, speed):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        with self._lock:
+            self._speed = float(speed)
+            self._rebase(self._position)
+
+    def seek(self, index):
+        """
+        Moves to frame `index`; it is emitted straight away if playing
+        """
+        with self._lock:
+            self._rebase(max(0, min(int(index), len(self.capture) - 1)))
+
+    def seek_time(self, seconds):
+        """
+        Moves to the last frame at or before `seconds` into the capture
+        """
+        if self.fps is not None:
+            index = int(seconds * self.fps)
+        else:
+            index = int(np.searchsorted(self.capture.timestamps, seconds,
+                                        side="right")) - 1
+        self.seek(index)
+
+    def stop(self):
+        with self._lock:
+            self.running = False
+            self._lock.notify_all()
+        self._scheduler.join()
+
+    def schedule_loop(self):
+        while True:
+            with self._lock:
+                while self.running and not self._playing:
+                    self._lock.wait()
+                if not self.running:
+                    return
+                generation = self._generation
+                index = self._position
+                due = self._anchor_time + ((self.media_time(index) -
+                                            self._anchor_media) / self._speed)
+
+                # Sleep (waking early for any seek, pause or speed change)
+                remaining = due - time.perf_counter()
+                if remaining > SLEEP_TIME:
+                    self._lock.wait(remaining - SLEEP_TIME)
+                    continue
+                if self._generation != generation:
+                    continue
+
+            # Sleeping rather than spinning lets other threads have the GIL
+            remaining = due - time.perf_counter()
+            while remaining > 0:
+                time.sleep(remaining)
+                remaining = due - time.perf_counter()
+
+            with self._lock:
+                if self._generation != generation:
+                    continue
+                if self._due_index is not None:
+                    self.skipped += 1
+                self._due_index = index
+                self._due_time = due
+
+                if index + 1 < len(self.capture):
+                    self._position = index + 1
+                elif self.loop:
+                    self._rebase(0, due + self.frame_interval() / self._speed)
+                else:
+                    self._position = index + 1
+                    self._playing = False
+            self.frame_due.emit()
+
+    @QtCore.pyqtSlot()
+    def on_frame_due(self):
+        with self._lock:
+            index, due = self._due_index, self._due_time
+            self._due_index = None
+            finished = index is not None and \
+                self._position >= len(self.capture)
+        if index is None:
+            return
+
+        self.lateness.record(max(time.perf_counter() - due, 0.0))
+        self.emitted += 1
+        self.new_frame.emit(self.frame_strands(index))
+        if finished:
+            self.finished.emit()
+
+    def frame_strands(self, index):
+        """
+        Returns frame `index` as a dict of strand number to RGB888 data
+        """
+        rgb = self.capture.frame(index).reshape(-1)
+        offsets = self._strand_offsets
+        return dict((strand, rgb[offsets[strand] * 3:offsets[strand + 1] * 3])
+                    for strand in range(len(offsets) - 1))
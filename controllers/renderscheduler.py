@@ -0,0 +1,149 @@
+import time
+import logging as log
+
+from PyQt5 import QtCore
+from PyQt5.QtGui import QGuiApplication
+
+# Assumed display refresh rate when the screen doesn't report one
+DEFAULT_MAX_FPS = 60.0
+
+# The target frame rate never drops below this
+MIN_FPS = 10.0
+
+# Load is the fraction of the time the GUI thread would spend painting at the
+# target frame rate.  Above LOAD_HIGH for DOWN_SECONDS the target is lowered,
+# below LOAD_LOW for UP_SECONDS it is raised; either way it is set to the rate
+# that gives LOAD_SETTLE, which is inside the band so the target doesn't flap.
+LOAD_HIGH = 0.85
+LOAD_LOW = 0.4
+LOAD_SETTLE = 0.6
+DOWN_SECONDS = 2
+UP_SECONDS = 3
+
+# Weight of the newest paint in the running average of paint cost
+COST_SMOOTHING = 0.1
+
+
+class RenderScheduler(QtCore.QObject):
+    """
+    Decides when the canvas repaints.
+
+    Nothing is painted until something asks for it with request(): a new
+    frame arriving, or a change in the UI.  Requests are merged, and paints
+    are spaced at least 1 / target_fps apart, so a flood of frames costs at
+    most target_fps paints a second and an idle scene costs nothing (apart
+    from an optional slow refresh at `idle_fps`, for anything that changed
+    without asking).
+
+    target_fps starts at `max_fps` (by default the display's refresh rate)
+    and follows the measured paint cost: it is lowered when painting would
+    keep the GUI thread too busy, and raised again when the cost drops.
+    """
+
+    target_fps_changed = QtCore.pyqtSignal(float)
+
+    def __init__(self, view, max_fps=None, idle_fps=2.0):
+        super(RenderScheduler, self).__init__()
+        self.view = view
+
+        if max_fps is None:
+            screen = QGuiApplication.primaryScreen()
+            max_fps = screen.refreshRate() if screen is not None else 0
+            if not max_fps or max_fps < MIN_FPS:
+                max_fps = DEFAULT_MAX_FPS
+        self.max_fps = float(max_fps)
+        self.target_fps = self.max_fps
+
+        self.requests = 0
+        self.paints = 0
+
+        self._dirty = False
+        self._running = True
+        self._last_paint = 0.0
+        self._cost = None
+        self._last_evaluation = time.perf_counter()
+        self._over = 0
+        self._under = 0
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.timeout.connect(self.on_timeout)
+
+        self._idle_timer = QtCore.QTimer(self)
+        self._idle_timer.timeout.connect(self.request)
+        if idle_fps > 0:
+            self._idle_timer.start(int(1000 / idle_fps))
+
+    @QtCore.pyqtSlot()
+    def request(self):
+        """
+        Asks for a repaint, as soon as target_fps allows
+        """
+        self.requests += 1
+        self._dirty = True
+        if self._running and not self._timer.isActive():
+            self._schedule()
+
+    def _schedule(self):
+        wait = self._last_paint + 1.0 / self.target_fps - time.perf_counter()
+        self._timer.start(max(0, int(wait * 1000)))
+
+    @QtCore.pyqtSlot()
+    def on_timeout(self):
+        if not self._dirty or not self._running:
+            return
+        self._dirty = False
+        self._last_paint = time.perf_counter()
+        self.paints += 1
+        self.view.update()
+
+    def stop(self):
+        """
+        Holds back repaints (for example while a scene is loading)
+        """
+        self._running = False
+        self._timer.stop()
+
+    def start(self):
+        self._running = True
+        self.request()
+
+    def painted(self, seconds):
+        """
+        Called by the view after each paint, with how long it took
+        """
+        if self._cost is None:
+            self._cost = seconds
+        else:
+            self._cost += COST_SMOOTHING * (seconds - self._cost)
+
+        now = time.perf_counter()
+        if now - self._last_evaluation >= 1.0:
+            self._last_evaluation = now
+            self._adapt()
+
+    @property
+    def load(self):
+        """
+        Fraction of the time painting would take at target_fps
+        """
+        return 0.0 if self._cost is None else self._cost * self.target_fps
+
+    def _adapt(self):
+        load = self.load
+        self._over = self._over + 1 if load > LOAD_HIGH else 0
+        self._under = self._under + 1 if load < LOAD_LOW else 0
+
+        if self._over >= DOWN_SECONDS:
+            fps = max(MIN_FPS, LOAD_SETTLE / self._cost)
+        elif self._under >= UP_SECONDS and self.target_fps < self.max_fps:
+            fps = min(self.max_fps, LOAD_SETTLE / max(self._cost, 1e-6))
+        else:
+            return
+
+        self._over = self._under = 0
+        if int(fps) != int(self.target_fps):
+            log.info("Target FPS: %d (paint %.1f ms)" % (fps, self._cost * 1000))
+            self.target_fps = fps
+            self.target_fps_changed.emit(fps)
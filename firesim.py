@@ -5,7 +5,6 @@ import signal
 import sys
 import logging as log
 
-from firesimgui import FireSimGUI
 from lib.arguments import parse_args
 
 def sig_handler(app, sig, frame):
@@ -19,8 +18,17 @@ def main():
     log.basicConfig(level=log.WARN)
     log.info("Booting FireSim...")
     args = parse_args()
-    sim = FireSimGUI(args)
+    # Imported here so that headless mode never loads the GUI (or OpenGL)
+    if args.headless:
+        from firesimheadless import FireSimHeadless
+        sim = FireSimHeadless(args)
+    else:
+        from firesimgui import FireSimGUI
+        sim = FireSimGUI(args)
     signal.signal(signal.SIGINT, functools.partial(sig_handler, sim))
+    # kill -USR1 dumps the stage timings of a running FireSim
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda sig, frame: sim.dump_timings())
     sys.exit(sim.run())
 
 if __name__ == "__main__":
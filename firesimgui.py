@@ -7,7 +7,7 @@ import os.path
 from OpenGL import GL
 
 from PyQt5.QtCore import (pyqtProperty, pyqtSignal, pyqtSlot, QObject, QUrl,
-                          QTimer, QSize, QRect)
+                          QSize, QRect)
 from PyQt5.QtQml import qmlRegisterType, QQmlComponent
 from PyQt5.QtQuick import QQuickView
 from PyQt5.QtWidgets import QApplication, QFileDialog
@@ -15,9 +15,13 @@ from PyQt5.QtGui import QIcon
 
 from ui.canvasview import CanvasView
 
+from lib.capture import CaptureReader
 from lib.config import Config
+from lib.timing import timings
 from models.scene import Scene
 from controllers.netcontroller import NetController
+from controllers.playbackcontroller import PlaybackController
+from controllers.renderscheduler import RenderScheduler
 
 
 class FireSimGUI(QObject):
@@ -64,22 +68,32 @@ class FireSimGUI(QObject):
         self.canvas = self.root.findChild(CanvasView)
         self.canvas.gui = self
         self.canvas.model.scene = self.scene
-        self.canvas.update_target_fps.connect(self.set_target_fps)
 
         self.set_properties_from_scene()
 
-        #self.net_thread = QThread()
-        #self.net_thread.start()
-        self.netcontroller = NetController(self)
-        #self.netcontroller.moveToThread(self.net_thread)
-        #self.netcontroller.start.emit()
+        self.netcontroller = NetController.from_config(
+            self, self.config, self.args, self.scene)
 
-        self.redraw_timer = QTimer()
-        self.set_target_fps(60)
-        self.redraw_timer.timeout.connect(self.canvas.update)
-        self.redraw_timer.start()
+        # Repaints happen when a frame arrives or the UI changes, not on a timer
+        self.scheduler = RenderScheduler(
+            self.canvas, max_fps=self.config.get("render-max-fps", None),
+            idle_fps=self.config.get("render-idle-fps", 2))
+        self.canvas.scheduler = self.scheduler
+        self.scene.changed.connect(self.scheduler.request)
 
         self.netcontroller.new_frame.connect(self.canvas.controller.on_new_frame)
+        # In coalescing mode the frame is only taken when the canvas paints
+        self.netcontroller.frame_ready.connect(self.scheduler.request)
+
+        self.playback = None
+        if self.args.play is not None:
+            self.playback = PlaybackController(
+                CaptureReader(self.args.play), self.scene,
+                speed=self.args.play_speed, loop=self.args.play_loop,
+                fps=self.args.play_fps)
+            self.playback.new_frame.connect(self.canvas.controller.on_new_frame)
+            self.playback.new_frame.connect(self.scheduler.request)
+            self.playback.play()
 
         geom_str = self.config.get("window-geometry", None)
         if geom_str is not None:
@@ -99,14 +113,6 @@ class FireSimGUI(QObject):
         self.canvas.setWidth(cw)
         self.canvas.setHeight(ch)
 
-    @pyqtSlot(float)
-    def set_target_fps(self, fps):
-        log.info("Target FPS: %d" % fps)
-        self.target_fps = fps
-        self.redraw_timer.stop()
-        self.redraw_timer.setInterval(int(1 / fps))
-        self.redraw_timer.start()
-
     @pyqtSlot()
     def about_to_quit(self):
         rect = self.view.geometry()
@@ -123,18 +129,27 @@ class FireSimGUI(QObject):
         return self.app.exec_()
 
     def on_close(self, e):
-        self.netcontroller.running = False
-        #self.net_thread.quit()
+        self.netcontroller.stop()
+        if self.playback is not None:
+            self.playback.stop()
         if self.args.profile:
             try:
                 import yappi
                 yappi.get_func_stats().print_all()
             except ImportError:
                 pass
+        if self.args.timings:
+            self.dump_timings()
+
+    def dump_timings(self):
+        """
+        Logs the stage timings, and writes them to the timing-file if set
+        """
+        timings.dump(self.config.get("timing-file", None))
 
     @pyqtSlot()
     def on_network_event(self):
-        self.canvas.update()
+        self.scheduler.request()
 
     @pyqtSlot()
     def on_btn_open(self):
@@ -143,12 +158,12 @@ class FireSimGUI(QObject):
                                                 "Scene Files (*.json)")
         if len(file_name[0]) > 0:
             self.scene.save()
-            self.redraw_timer.stop()
+            self.scheduler.stop()
             self.scene.set_filepath_and_load(file_name[0])
             self.config['last-opened-scene'] = file_name[0]
             self.config.save()
             self.set_properties_from_scene()
-            self.redraw_timer.start()
+            self.scheduler.start()
 
     @pyqtSlot()
     def on_btn_new(self):
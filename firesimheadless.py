@@ -0,0 +1,162 @@
+import logging as log
+
+import numpy as np
+
+from PyQt5.QtCore import pyqtSignal, pyqtSlot, QCoreApplication, QObject, QTimer
+
+from lib.capture import CaptureReader
+from lib.config import Config
+from lib.raster import Rasterizer, PNGSequenceWriter, RawVideoWriter
+from lib.timing import timings
+from models.canvas import Canvas
+from models.scene import Scene
+from controllers.netcontroller import NetController
+from controllers.playbackcontroller import PlaybackController
+
+
+class FireSimHeadless(QObject):
+    """
+    Runs FireSim without a window: loads a scene, receives frames from the
+    network and keeps the latest one in the canvas model's color buffer.
+
+    Nothing is drawn.  Anything that wants to look at frames (recording,
+    statistics, offscreen rendering) connects to frame_applied, which is
+    emitted after each frame has been copied into model.color_buffer.
+    Rendering to PNG files or raw video is built in (see --render-dir and
+    --render-raw).
+    """
+
+    frame_applied = pyqtSignal()
+
+    def __init__(self, args=None):
+        QObject.__init__(self)
+
+        self.app = QCoreApplication(["FireSim"])
+        self.args = args
+        self.config = Config("data/config.json")
+
+        if self.args.profile:
+            try:
+                import yappi
+                yappi.start()
+            except ImportError:
+                log.error("Could not enable YaPPI profiling")
+
+        scene_file_path = (self.args.scene if self.args.scene is not None
+                           else self.config.get("last-opened-scene"))
+
+        self.scene = Scene(scene_file_path)
+        self.model = Canvas()
+        self.model.scene = self.scene
+        self.model.update_color_buffer()
+
+        self.frames_applied = 0
+
+        self.render_writers = []
+        if self.args.render_dir is not None:
+            self.render_writers.append(PNGSequenceWriter(self.args.render_dir))
+        if self.args.render_raw is not None:
+            self.render_writers.append(RawVideoWriter(self.args.render_raw))
+        if self.args.render_size is not None:
+            self.render_size = tuple(int(v) for v in
+                                     self.args.render_size.split("x"))
+        else:
+            self.render_size = tuple(int(v) for v in self.scene.extents)
+        self._rasterizer = None
+        self._rasterizer_version = None
+        self._render_colors = None
+        self._render_image = None
+        if len(self.render_writers) > 0:
+            self.frame_applied.connect(self.render_frame)
+
+        # Nothing paints here to take coalesced frames, so every frame is
+        # passed on as it arrives
+        self.netcontroller = NetController.from_config(
+            self, self.config, self.args, self.scene, coalesce=False)
+        self.netcontroller.new_frame.connect(self.on_new_frame)
+
+        self.playback = None
+        if self.args.play is not None:
+            self.playback = PlaybackController(
+                CaptureReader(self.args.play), self.scene,
+                speed=self.args.play_speed, loop=self.args.play_loop,
+                fps=self.args.play_fps)
+            self.playback.new_frame.connect(self.on_new_frame)
+            # Rendering a capture to images is done once it has played out
+            if self.args.duration is None:
+                self.playback.finished.connect(self.quit)
+            self.playback.play()
+
+        # Without a window there may be no Qt events for long stretches;
+        # waking up regularly lets Python run its signal handlers (Ctrl-C).
+        self._signal_timer = QTimer(self)
+        self._signal_timer.timeout.connect(lambda: None)
+        self._signal_timer.start(250)
+
+        if self.args.duration is not None:
+            QTimer.singleShot(int(self.args.duration * 1000), self.quit)
+
+        log.info("Running headless with scene %s" % self.scene.name)
+
+    @pyqtSlot(dict)
+    def on_new_frame(self, frame):
+        with timings.span("assemble"):
+            self.model.set_frame(frame)
+        self.frames_applied += 1
+        self.frame_applied.emit()
+
+    def rasterizer(self):
+        """
+        Returns a Rasterizer for the current scene geometry
+        """
+        if self._rasterizer_version != self.scene.geometry_version:
+            self._rasterizer = Rasterizer(self.scene.get_pixel_group_locations(),
+                                          self.scene.extents, self.render_size,
+                                          blurred=self.args.render_blurred)
+            self._rasterizer_version = self.scene.geometry_version
+            self._render_colors = np.zeros((self._rasterizer.num_points, 4),
+                                           dtype=np.uint8)
+        return self._rasterizer
+
+    @pyqtSlot()
+    def render_frame(self):
+        with timings.span("render"):
+            rasterizer = self.rasterizer()
+            colors = self.model.gather_render_colors(self._render_colors)
+            self._render_image = rasterizer.render(colors, self._render_image)
+        for writer in self.render_writers:
+            writer.write(self._render_image)
+
+    @pyqtSlot()
+    def quit(self):
+        self.app.quit()
+
+    def run(self):
+        ret = self.app.exec_()
+        self.shutdown()
+        return ret
+
+    def dump_timings(self):
+        """
+        Logs the stage timings, and writes them to the timing-file if set
+        """
+        timings.dump(self.config.get("timing-file", None))
+
+    def shutdown(self):
+        self.netcontroller.stop()
+        if self.playback is not None:
+            self.playback.stop()
+            log.warning("Played %d frames (%d skipped)" %
+                        (self.playback.emitted, self.playback.skipped))
+        for writer in self.render_writers:
+            writer.close()
+        self.netcontroller.get_metrics()
+        log.warning("Net: %s" % self.netcontroller.metrics.summary())
+        if self.args.profile:
+            try:
+                import yappi
+                yappi.get_func_stats().print_all()
+            except ImportError:
+                pass
+        if self.args.timings:
+            self.dump_timings()
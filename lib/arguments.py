@@ -5,5 +5,31 @@ import sys
 def parse_args():
     parser = argparse.ArgumentParser(description="FireSim")
     parser.add_argument("--profile", action='store_const', const=True, default=False, help="Enable profiling")
+    parser.add_argument("--timings", action='store_const', const=True, default=False,
+                        help="Log stage timings on exit")
     parser.add_argument('--scene', type=str, help="Scene to load")
+    parser.add_argument("--headless", action='store_const', const=True, default=False,
+                        help="Receive frames without opening a window")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Quit after this many seconds (headless only)")
+    parser.add_argument("--stats-interval", type=float, default=None,
+                        help="Log network statistics every N seconds")
+    parser.add_argument("--record", type=str, default=None,
+                        help="Record received frames to this capture file")
+    parser.add_argument("--play", type=str, default=None,
+                        help="Play back frames from this capture file")
+    parser.add_argument("--play-speed", type=float, default=1.0,
+                        help="Playback speed multiplier")
+    parser.add_argument("--play-fps", type=float, default=None,
+                        help="Play back at a fixed frame rate instead of the recorded timing")
+    parser.add_argument("--play-loop", action='store_const', const=True, default=False,
+                        help="Loop playback")
+    parser.add_argument("--render-dir", type=str, default=None,
+                        help="Render each frame to a PNG in this directory (headless only)")
+    parser.add_argument("--render-raw", type=str, default=None,
+                        help="Write rendered frames as raw rgb24 video to this file, or - for stdout (headless only)")
+    parser.add_argument("--render-size", type=str, default=None,
+                        help="Rendered image size as WIDTHxHEIGHT (default: scene size)")
+    parser.add_argument("--render-blurred", action='store_const', const=True, default=False,
+                        help="Render with blurred (larger) pixels")
     return parser.parse_args()
@@ -32,44 +32,143 @@ def struct_flat(arr):
 class BufferUtils(object):
     """
     Utilities for working with frame buffers
+
+    Pixels are addressed linearly, strand by strand: the index of logical
+    address (strand, fixture, offset) is the start of the strand, plus the
+    fixture's offset along the strand, plus the pixel offset.  The lookup
+    tables are flat arrays built by init(), so both directions are O(1) and
+    can be applied to whole arrays of addresses at once.
+
+    The tables describe one scene at a time.  Methods that take a `scene`
+    rebuild them first if they were built for another scene, or before the
+    scene's addressing last changed (see Scene.address_version).
     """
-    _first_time = True
     num_strands = 0
     max_fixtures = 0
-    _max_pixels_per_fixture = 0
     _max_pixels_per_strand = 0
     _buffer_length = 0
     _app = None
-    _strand_lengths = {}
-    _strand_num_fixtures = {}
-    _fixture_lengths = {}
-    _fixture_extents = {}
-    _fixture_pixels = {}
-    _pixel_offset_cache = {}
-    _pixel_index_cache = {}
-    _pixel_logical_cache = {}
+
+    # Indexed by strand id; _strand_offsets has one extra trailing entry
+    _strand_lengths = np.zeros(0, dtype=np.int32)
+    _strand_offsets = np.zeros(1, dtype=np.int32)
+    _strand_first_fixture = np.zeros(1, dtype=np.int32)
+
+    # Indexed by strand_first_fixture[strand] + fixture
+    _fixture_offsets = np.zeros(0, dtype=np.int32)
+    _fixture_lengths = np.zeros(0, dtype=np.int32)
+
+    # (strand, fixture, offset) of every buffer index; -1 for unassigned pixels
+    _logical_table = None
+
+    # address_version of the scene the tables were built from
+    _address_version = None
 
     @classmethod
     def set_app(cls, app):
         cls._app = app
 
     @classmethod
-    def init(cls):
+    def init(cls, scene=None):
+        """
+        Generates the lookup tables.  Must be called before any other methods,
+        and again whenever the scene's addressing changes.
+        """
+        if scene is None:
+            scene = cls._app.scene
+
+        cls._address_version = scene.address_version
+        fh = scene.fixture_hierarchy()
+        strand_lengths = cls._scene_strand_lengths(scene, fh)
+        num_strands = len(strand_lengths)
+
+        num_fixtures = np.zeros(num_strands, dtype=np.int32)
+        fixture_offsets = []
+        fixture_lengths = []
+        for strand in range(num_strands):
+            fixtures = fh.get(strand, {})
+            num_fixtures[strand] = len(fixtures)
+            for fixture in range(len(fixtures)):
+                pg = fixtures[fixture]
+                fixture_offsets.append(pg.offset)
+                fixture_lengths.append(pg.count)
+
+        cls.num_strands = num_strands
+        cls.max_fixtures = int(num_fixtures.max()) if num_strands > 0 else 0
+        cls._max_pixels_per_strand = (int(strand_lengths.max())
+                                      if num_strands > 0 else 0)
+        cls._strand_lengths = strand_lengths
+        cls._strand_offsets = np.zeros(num_strands + 1, dtype=np.int32)
+        np.cumsum(strand_lengths, out=cls._strand_offsets[1:])
+        cls._strand_first_fixture = np.zeros(num_strands + 1, dtype=np.int32)
+        np.cumsum(num_fixtures, out=cls._strand_first_fixture[1:])
+        cls._buffer_length = int(cls._strand_offsets[-1])
+
+        # Fixture offsets become absolute buffer indices
+        fixture_strands = np.repeat(np.arange(num_strands, dtype=np.int32),
+                                    num_fixtures)
+        cls._fixture_lengths = np.array(fixture_lengths, dtype=np.int32)
+        cls._fixture_offsets = (np.array(fixture_offsets, dtype=np.int32) +
+                                cls._strand_offsets[fixture_strands])
+
+        table = np.full((cls._buffer_length, 3), -1, dtype=np.int32)
+        if len(fixture_lengths) > 0:
+            pixel_fixture = np.repeat(np.arange(len(fixture_lengths)),
+                                      cls._fixture_lengths)
+            pixel_offset = (np.arange(len(pixel_fixture)) -
+                            np.repeat(np.cumsum(cls._fixture_lengths) -
+                                      cls._fixture_lengths,
+                                      cls._fixture_lengths))
+            indices = cls._fixture_offsets[pixel_fixture] + pixel_offset
+            strands = fixture_strands[pixel_fixture]
+            table[indices, 0] = strands
+            table[indices, 1] = pixel_fixture - cls._strand_first_fixture[strands]
+            table[indices, 2] = pixel_offset
+        cls._logical_table = table
+
+    @staticmethod
+    def _scene_strand_lengths(scene, fh):
         """
-        Generates the caches and initializes local storage.  Must be called before any other methods.
+        Returns the length of each strand of `scene`: its configured length,
+        or enough to hold every fixture on it if that is longer
         """
-        cls.num_strands, cls._max_pixels_per_strand = cls._app.scene.get_matrix_extents()
-        cls._buffer_length = cls.num_strands * cls._max_pixels_per_strand
-        fh = cls._app.scene.fixture_hierarchy()
+        num_strands = (max(fh) + 1) if len(fh) > 0 else 0
 
-        for strand in fh:
-            cls._strand_lengths[strand] = sum([fh[strand][f].pixels for f in fh[strand]])
+        strand_lengths = np.zeros(num_strands, dtype=np.int32)
+        for strand_settings in (scene.strands or []):
+            strand = strand_settings.get("id", None)
+            if strand is not None and strand < num_strands:
+                strand_lengths[strand] = strand_settings.get("length", 0)
 
-        for strand in fh:
-            cls._strand_num_fixtures[strand] = len(fh[strand])
-            for fixture in fh[strand]:
-                for offset in range(cls._app.scene.fixture(strand, fixture).pixels):
-                    cls.logical_to_index((strand, fixture, offset))
+        for strand, fixtures in fh.items():
+            for pg in fixtures.values():
+                strand_lengths[strand] = max(strand_lengths[strand],
+                                             pg.offset + pg.count)
+        return strand_lengths
+
+    @classmethod
+    def strand_offsets(cls, scene):
+        """
+        Returns the buffer index of the start of each of the scene's strands,
+        plus the buffer length at the end, as init() would lay them out.
+        Unlike init(), this leaves the lookup tables alone.
+        """
+        strand_lengths = cls._scene_strand_lengths(scene,
+                                                   scene.fixture_hierarchy())
+        offsets = np.zeros(len(strand_lengths) + 1, dtype=np.intp)
+        np.cumsum(strand_lengths, out=offsets[1:])
+        return offsets
+
+    @classmethod
+    def _ensure_tables(cls, scene):
+        """
+        Builds the tables if they are missing, or out of date for `scene`
+        """
+        if scene is None:
+            if cls._logical_table is None:
+                cls.init()
+        elif cls._address_version != scene.address_version:
+            cls.init(scene)
 
     @classmethod
     def logical_to_index(cls, logical_address, scene=None):
@@ -77,51 +176,55 @@ class BufferUtils(object):
         Given a logical (strand, fixture, offset) pixel address, returns the index
         into a 1-dimensional pixel list (the storage type for frames, locations, etc).
         """
-        index = cls._pixel_index_cache.get(logical_address, None)
-
-        if index is None:
-
-            if scene is None:
-                scene = cls._app.scene
+        cls._ensure_tables(scene)
+
+        strand, fixture, offset = logical_address
+        try:
+            if strand < 0 or fixture < 0 or \
+                    fixture >= cls._strand_first_fixture[strand + 1] - \
+                    cls._strand_first_fixture[strand]:
+                raise IndexError
+            fixture_id = cls._strand_first_fixture[strand] + fixture
+            if offset < 0 or offset >= cls._fixture_lengths[fixture_id]:
+                raise IndexError
+        except IndexError:
+            raise ValueError("Logical address results in index out of range: "
+                             "%s" % repr(logical_address))
+
+        return int(cls._fixture_offsets[fixture_id] + offset)
 
-            strand, fixture, offset = logical_address
-            fh = scene.fixture_hierarchy()
-            index = 0
-
-            # (1) Skip to the start of the strand
-            for i in range(strand):
-                index += cls._strand_lengths[i]
-
-            # (2) Skip to the fixture in question
-            for i in range(fixture):
-                index += scene.fixture(strand, i).pixels
-
-            fixture_start = index
-            num_pixels = scene.fixture(strand, fixture).pixels
-            fixture_end = index + num_pixels
-
-            # (3) Add the offset along the fixture
-            index += offset
-            if index < 0 or index >= cls._buffer_length:
-                raise ValueError("Logical address results in index out of range: "
-                                 "%s => %d" % (repr(logical_address), index,))
-
-            cls._pixel_index_cache[logical_address] = index
-            cls._pixel_logical_cache[index] = logical_address
-            cls._fixture_extents[(strand, fixture)] = (fixture_start, fixture_end)
-            cls._fixture_pixels[(strand, fixture)] = num_pixels
-
-        return index
+    @classmethod
+    def logical_to_index_array(cls, logical_addresses, scene=None):
+        """
+        Vectorized logical_to_index: converts an (N, 3) array of logical
+        addresses to an array of N indices.  Addresses are not range-checked.
+        """
+        cls._ensure_tables(scene)
+        logical_addresses = np.asarray(logical_addresses)
+        fixture_ids = (cls._strand_first_fixture[logical_addresses[:, 0]] +
+                       logical_addresses[:, 1])
+        return cls._fixture_offsets[fixture_ids] + logical_addresses[:, 2]
 
     @classmethod
-    def index_to_logical(cls, index):
+    def index_to_logical(cls, index, scene=None):
         """
         Given an index into a 1-dimensional pixel buffer, returns a (strand, fixture, offset) address.
         """
-        logical = cls._pixel_logical_cache.get(index, None)
-        if logical is None:
+        cls._ensure_tables(scene)
+        if index < 0 or index >= cls._buffer_length or \
+                cls._logical_table[index, 0] < 0:
             raise ValueError("Index out of range: %s" % repr(index))
-        return logical
+        strand, fixture, offset = cls._logical_table[index].tolist()
+        return (strand, fixture, offset)
+
+    @classmethod
+    def index_to_logical_array(cls, indices, scene=None):
+        """
+        Vectorized index_to_logical: returns an (N, 3) int32 array of logical
+        addresses.  Indices not covered by any fixture map to (-1, -1, -1).
+        """
+        cls._ensure_tables(scene)
+        return cls._logical_table[indices]
 
     @classmethod
     def create_buffer(cls):
@@ -141,54 +244,36 @@ class BufferUtils(object):
         return (cls._buffer_length)
 
     @classmethod
-    def get_buffer_address(cls, location, scene=None):
-        """
-        Calculates the in-buffer address for a given [s:f:p] address (see above)
-        """
-        if scene is None:
-            scene = cls._app.scene
-
-        pixel_offset = cls._pixel_offset_cache.get(location, None)
-        if pixel_offset is None:
-            strand, fixture, pixel = location
-            pixel_offset = pixel
-            for fixture_id in range(fixture):
-                num_fixture_pixels = cls._fixture_pixels.get((strand, fixture), None)
-                if num_fixture_pixels is None:
-                    num_fixture_pixels = scene.fixture(strand, fixture).pixels
-                    cls._fixture_pixels[(strand, fixture)] = num_fixture_pixels
-                pixel_offset += num_fixture_pixels
-            cls._pixel_offset_cache[location] = pixel_offset
-
-        raise DeprecationWarning
-        return (location[0], pixel_offset)
-
-    @classmethod
-    def get_fixture_extents(cls, strand, fixture):
+    def get_fixture_extents(cls, strand, fixture, scene=None):
         """
         Returns a tuple of (start, end) containing the buffer pixel addresses on a given fixtures
         """
-        return cls._fixture_extents[(strand, fixture)]
+        cls._ensure_tables(scene)
+        fixture_id = cls._strand_first_fixture[strand] + fixture
+        start = int(cls._fixture_offsets[fixture_id])
+        return (start, start + int(cls._fixture_lengths[fixture_id]))
 
     @classmethod
-    def get_strand_length(cls, strand):
+    def get_strand_length(cls, strand, scene=None):
         """
         Returns the length of a strand (in pixels)
         """
-        return cls._strand_lengths[strand]
+        cls._ensure_tables(scene)
+        return int(cls._strand_lengths[strand])
 
     @classmethod
-    def get_strand_extents(cls, strand):
-        start = 0
-        for i in range(strand):
-            start += cls._strand_lengths[i]
-
-        return (start, start + cls._strand_lengths[strand])
+    def get_strand_extents(cls, strand, scene=None):
+        cls._ensure_tables(scene)
+        return (int(cls._strand_offsets[strand]),
+                int(cls._strand_offsets[strand + 1]))
 
     @classmethod
-    def strand_num_fixtures(cls, strand):
-        return cls._strand_num_fixtures[strand]
+    def strand_num_fixtures(cls, strand, scene=None):
+        cls._ensure_tables(scene)
+        return int(cls._strand_first_fixture[strand + 1] -
+                   cls._strand_first_fixture[strand])
 
     @classmethod
-    def fixture_length(cls, strand, fixture):
-        return cls._fixture_pixels[(strand, fixture)]
+    def fixture_length(cls, strand, fixture, scene=None):
+        cls._ensure_tables(scene)
+        return int(cls._fixture_lengths[cls._strand_first_fixture[strand] + fixture])
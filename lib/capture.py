@@ -0,0 +1,237 @@
+"""
+Capture files: recordings of received frames that can be memory-mapped.
+
+A capture is a fixed-size header followed by fixed-stride frame records, so
+frame N is at a known offset and the whole file can be opened with
+np.memmap.  All integers are little-endian.
+
+    header (HEADER_SIZE bytes):
+        magic         8 bytes  CAPTURE_MAGIC
+        version       uint32   CAPTURE_VERSION
+        header_size   uint32   offset of the first frame record
+        pixel_count   uint32   pixels per frame
+        frame_stride  uint32   bytes per frame record
+        scene_hash    32 bytes sha256 of the scene's addressing (scene_hash())
+        (zero padding up to header_size)
+
+    frame record (frame_stride bytes):
+        timestamp     float64  seconds since the start of the capture
+        rgb           pixel_count x 3 uint8, in BufferUtils order
+        (zero padding to a multiple of 8 bytes)
+"""
+from collections import deque
+import hashlib
+import json
+import logging as log
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from lib.buffer_utils import BufferUtils
+
+CAPTURE_MAGIC = b'FSCAPTUR'
+CAPTURE_VERSION = 1
+
+HEADER = struct.Struct("<8sIIII32s")
+HEADER_SIZE = 64
+
+
+def frame_dtype(pixel_count):
+    """
+    Returns the numpy dtype of one frame record
+    """
+    payload = 8 + pixel_count * 3
+    padding = -payload % 8
+    fields = [('timestamp', '<f8'), ('rgb', np.uint8, (pixel_count, 3))]
+    if padding:
+        fields.append(('padding', np.uint8, (padding,)))
+    return np.dtype(fields)
+
+
+def scene_hash(scene):
+    """
+    Returns a sha256 digest of the scene's addressing (the strand, offset and
+    pixel count of every pixel group, and the strand settings).  Moving pixel
+    groups around does not change it; anything that changes the buffer layout
+    does.
+    """
+    groups = sorted((pg.strand, pg.offset, pg.count)
+                    for pg in scene.pixel_groups)
+    data = json.dumps({"pixel-groups": groups, "strands": scene.strands or []},
+                      sort_keys=True)
+    return hashlib.sha256(data.encode("utf-8")).digest()
+
+
+def read_header(path):
+    """
+    Returns the header of a capture file as a dict
+    """
+    with open(path, "rb") as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER.size:
+        raise ValueError("%s is not a capture file" % path)
+    magic, version, header_size, pixel_count, frame_stride, digest = \
+        HEADER.unpack_from(data)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError("%s is not a capture file" % path)
+    if version != CAPTURE_VERSION:
+        raise ValueError("Unsupported capture version %d" % version)
+    return {
+        "version": version,
+        "header_size": header_size,
+        "pixel_count": pixel_count,
+        "frame_stride": frame_stride,
+        "scene_hash": digest,
+    }
+
+
+class CaptureReader(object):
+    """
+    Memory-maps a capture file.  `frames` is a structured array of every
+    frame record, so reading frame N does not touch any other part of the
+    file:
+
+        capture = CaptureReader("show.fscap")
+        capture.timestamps[n], capture.frame(n)
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header = read_header(path)
+        self.header_size = header["header_size"]
+        self.pixel_count = header["pixel_count"]
+        self.scene_hash = header["scene_hash"]
+
+        dtype = frame_dtype(self.pixel_count)
+        if dtype.itemsize != header["frame_stride"]:
+            raise ValueError("Frame stride %d does not match %d pixels" %
+                             (header["frame_stride"], self.pixel_count))
+
+        # A capture that was cut short may end with part of a frame
+        num_frames = (os.path.getsize(path) - self.header_size) // dtype.itemsize
+        if num_frames > 0:
+            self.frames = np.memmap(path, dtype=dtype, mode="r",
+                                    offset=self.header_size, shape=(num_frames,))
+        else:
+            self.frames = np.zeros(0, dtype=dtype)
+        self.timestamps = self.frames['timestamp']
+
+    def __len__(self):
+        return len(self.frames)
+
+    def frame(self, n):
+        """
+        Returns the (pixel_count, 3) uint8 colors of frame n
+        """
+        return self.frames[n]['rgb']
+
+    def matches(self, scene):
+        return self.scene_hash == scene_hash(scene)
+
+
+class CaptureWriter(object):
+    """
+    Records frames to a capture file.
+
+    write_frame() only copies the frame's strands into a preallocated record
+    and queues it; a background thread does the file writes.  If the disk
+    falls `queue_size` records behind, new frames are dropped (and counted in
+    `dropped`) rather than blocking the caller.  Strands missing from a frame
+    are recorded as black.
+    """
+
+    def __init__(self, path, strand_offsets, digest, queue_size=64):
+        """
+        strand_offsets: buffer index of the start of each strand, plus the
+                        total pixel count at the end (as BufferUtils lays out)
+        digest:         the scene_hash() of the scene being recorded
+        """
+        self.path = path
+        self.strand_offsets = np.asarray(strand_offsets, dtype=np.intp)
+        self.pixel_count = int(self.strand_offsets[-1])
+        self.dtype = frame_dtype(self.pixel_count)
+
+        self.frames_written = 0
+        self.dropped = 0
+        self._start_time = None
+
+        self._free = deque(np.zeros(1, dtype=self.dtype)
+                           for _ in range(queue_size))
+        self._queued = deque()
+        self._wakeup = threading.Event()
+        self._running = True
+
+        self._file = open(path, "wb")
+        header = HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, HEADER_SIZE,
+                             self.pixel_count, self.dtype.itemsize, digest)
+        self._file.write(header.ljust(HEADER_SIZE, b'\0'))
+
+        self._writer = threading.Thread(target=self.write_loop,
+                                        name="CaptureWriter", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def for_scene(cls, path, scene, queue_size=64):
+        return cls(path, BufferUtils.strand_offsets(scene), scene_hash(scene),
+                   queue_size)
+
+    def write_frame(self, strands, timestamp=None):
+        """
+        Queues one frame, given as a dict of strand number to RGB888 data.
+        `timestamp` is a time.perf_counter() value; it defaults to now.
+        """
+        if timestamp is None:
+            timestamp = time.perf_counter()
+        if self._start_time is None:
+            self._start_time = timestamp
+
+        try:
+            record = self._free.popleft()
+        except IndexError:
+            self.dropped += 1
+            return
+
+        record['timestamp'] = timestamp - self._start_time
+        rgb = record['rgb'][0].reshape(-1)
+        rgb[:] = 0
+        offsets = self.strand_offsets
+        for strand, data in strands.items():
+            if strand < 0 or strand >= len(offsets) - 1:
+                continue
+            start = offsets[strand] * 3
+            n = min(len(data), offsets[strand + 1] * 3 - start)
+            rgb[start:start + n] = data[:n]
+
+        self._queued.append(record)
+        self._wakeup.set()
+
+    def write_loop(self):
+        while True:
+            self._wakeup.wait(0.25)
+            self._wakeup.clear()
+            while True:
+                try:
+                    record = self._queued.popleft()
+                except IndexError:
+                    break
+                try:
+                    self._file.write(record.data)
+                    self.frames_written += 1
+                except (IOError, OSError):
+                    log.exception("Error writing capture to %s" % self.path)
+                    self._running = False
+                self._free.append(record)
+            if not self._running:
+                break
+
+    def close(self):
+        """
+        Writes out everything still queued and closes the file
+        """
+        self._running = False
+        self._wakeup.set()
+        self._writer.join()
+        self._file.close()
@@ -0,0 +1,152 @@
+from collections import deque
+import numpy as np
+
+
+class Frame(object):
+    """
+    One frame worth of strand data.
+
+    The backing storage for each strand is kept when the frame is recycled, so
+    refilling a frame from the pool does not allocate once it has seen every
+    strand at its full length.
+    """
+
+    def __init__(self):
+        self.strands = {}
+        self.started = 0
+        self.timestamp = 0
+        self._storage = {}
+
+    def clear(self):
+        self.strands.clear()
+        self.started = 0
+        self.timestamp = 0
+
+    def set_strand(self, strand, payload):
+        """
+        Copies payload (any uint8 array or view) into this frame's storage for
+        the given strand.
+        """
+        count = len(payload)
+        storage = self._storage.get(strand, None)
+        if storage is None or len(storage) < count:
+            storage = np.empty(count, dtype=np.uint8)
+            self._storage[strand] = storage
+        data = storage[:count]
+        data[:] = payload
+        self.strands[strand] = data
+
+    def write_strand(self, strand, offset, payload):
+        """
+        Copies payload into the given strand starting at byte `offset`,
+        extending the strand if needed.  Used when a strand arrives in pieces.
+        """
+        end = offset + len(payload)
+        current = self.strands.get(strand, None)
+        length = end if current is None else max(len(current), end)
+        storage = self._storage.get(strand, None)
+        if storage is None or len(storage) < length:
+            grown = np.zeros(length, dtype=np.uint8)
+            if current is not None:
+                grown[:len(current)] = current
+            storage = grown
+            self._storage[strand] = storage
+        elif current is None:
+            storage[:offset] = 0
+        elif offset > len(current):
+            storage[len(current):offset] = 0
+        storage[offset:end] = payload
+        self.strands[strand] = storage[:length]
+
+
+class FrameQueue(object):
+    """
+    Hands complete frames from the network ingest thread to the GUI thread.
+
+    Frames come from a fixed pool (queue depth + one being filled + one being
+    displayed), so frames are handed over by reference and never copied.
+
+    No lock is needed between the producer and consumer.  Both ends only use
+    single deque operations, which are atomic, and a frame only ever leaves a
+    deque through one popleft() by one thread.  So although both threads pop
+    from the ready queue (the consumer in take(), the producer in acquire()
+    when the pool is empty), each queued frame goes to exactly one of them
+    and can't be recycled while the other is still using it.
+
+    Drop policies, applied when the consumer falls behind:
+
+        "drop-oldest": keep up to `depth` frames, discarding the oldest
+        "latest":      keep only the newest frame (depth is forced to 1)
+
+    `spare` adds frames to the pool for producers that fill several frames at
+    once, or consumers that hold on to more than the displayed frame.
+    """
+
+    POLICIES = ("drop-oldest", "latest")
+
+    def __init__(self, depth=2, policy="drop-oldest", spare=0):
+        if policy not in self.POLICIES:
+            raise ValueError("policy must be one of %s" % ", ".join(self.POLICIES))
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+
+        self.policy = policy
+        self.depth = 1 if policy == "latest" else depth
+        # Counted separately because each is only written by one thread
+        self._dropped_by_consumer = 0
+        self._dropped_by_producer = 0
+
+        self._ready = deque()
+        self._free = deque(Frame() for _ in range(self.depth + 2 + spare))
+
+    def acquire(self):
+        """
+        Returns an empty frame for the producer to fill
+        """
+        try:
+            frame = self._free.popleft()
+        except IndexError:
+            # The consumer has fallen behind and every spare frame is queued;
+            # reclaim the oldest queued frame rather than growing the pool.
+            try:
+                frame = self._ready.popleft()
+                self._dropped_by_producer += 1
+            except IndexError:
+                frame = Frame()
+        frame.clear()
+        return frame
+
+    def publish(self, frame):
+        """
+        Queues a complete frame for the consumer
+        """
+        self._ready.append(frame)
+
+    def take(self):
+        """
+        Returns the oldest queued frame, or None if there is nothing new.
+        Frames beyond the newest `depth` are discarded first.  The frame must
+        be given back with release() once it is no longer used.
+        """
+        while len(self._ready) > self.depth:
+            self._free.append(self._ready.popleft())
+            self._dropped_by_consumer += 1
+        try:
+            return self._ready.popleft()
+        except IndexError:
+            return None
+
+    @property
+    def dropped(self):
+        return self._dropped_by_consumer + self._dropped_by_producer
+
+    def reset_counters(self):
+        self._dropped_by_consumer = 0
+        self._dropped_by_producer = 0
+
+    def release(self, frame):
+        if frame is not None:
+            self._free.append(frame)
+
+    def __len__(self):
+        return len(self._ready)
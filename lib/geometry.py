@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 
 def vec2_sum(v1, v2):
@@ -36,3 +37,14 @@ def distance_point_to_line(start, end, point):
     return (abs( (end[0] - start[0]) * (start[1] - point[1]) -
                  (start[0] - point[0]) * (end[1] - start[1]) ) /
             distance(start, end))
+
+
+def points_along_line(start, end, count):
+    """
+    Returns count points evenly spaced from start towards end, as a
+    (count, 2) float array computed without a Python-level loop.  The first
+    point is at start; the last is one step short of end.
+    """
+    steps = np.arange(count, dtype=float) / max(count, 1)
+    return np.asarray(start, dtype=float) + np.outer(
+        steps, np.subtract(end, start, dtype=float))
@@ -0,0 +1,207 @@
+from bisect import bisect_left
+from collections import Counter
+import json
+import logging as log
+import time
+
+import numpy as np
+
+# Histogram bucket upper edges, in milliseconds.  The last bucket collects
+# everything above the final edge.
+DEFAULT_EDGES_MS = (0.25, 0.5, 1, 2, 4, 8, 12, 16, 20, 25, 33, 50, 67, 100,
+                    250, 500, 1000)
+
+
+class Histogram(object):
+    """
+    Fixed-bucket histogram of durations.
+
+    Values are recorded in seconds and reported in milliseconds.  Recording
+    is a single bucket increment, so it is cheap enough for the ingest thread.
+    """
+
+    def __init__(self, edges_ms=DEFAULT_EDGES_MS):
+        self.edges_ms = np.asarray(edges_ms, dtype=np.float64)
+        self._edges = self.edges_ms / 1000.0
+        # bisect on a list is several times faster than np.searchsorted for
+        # a single value
+        self._edge_list = self._edges.tolist()
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(len(self._edges) + 1, dtype=np.int64)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        self.counts[bisect_left(self._edge_list, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def mean(self):
+        return 0.0 if self.count == 0 else self.total / self.count
+
+    def percentile(self, p):
+        """
+        Returns the upper edge (in seconds) of the bucket holding the p-th
+        percentile, or the maximum if it falls in the last bucket.
+        """
+        if self.count == 0:
+            return 0.0
+        i = int(np.searchsorted(np.cumsum(self.counts), self.count * p / 100.0))
+        return self._edges[i] if i < len(self._edges) else self.max
+
+    def snapshot(self):
+        """
+        Returns a JSON-friendly summary, with times in milliseconds
+        """
+        ms = lambda s: None if s is None else round(s * 1000.0, 3)
+        return {
+            "count": self.count,
+            "mean": ms(self.mean()),
+            "min": ms(self.min),
+            "max": ms(self.max),
+            "p50": ms(self.percentile(50)),
+            "p90": ms(self.percentile(90)),
+            "p99": ms(self.percentile(99)),
+            "buckets": [[None if edge is None else float(edge), int(n)]
+                        for edge, n in zip(list(self.edges_ms) + [None],
+                                           self.counts)],
+        }
+
+
+class MetricsReport(object):
+    """
+    Reporting shared by collections of metrics, which provide snapshot(), a
+    JSON-serializable dict of everything collected, and summary(), the
+    important parts of it on one line
+    """
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=4, sort_keys=True)
+
+    def write_json(self, path):
+        """
+        Writes the snapshot to `path`, logging rather than raising on errors
+        """
+        try:
+            with open(path, "w") as f:
+                f.write(self.to_json())
+        except (IOError, OSError):
+            log.exception("Could not write %s" % path)
+
+
+class NetMetrics(MetricsReport):
+    """
+    Counters and timing histograms for the network path.
+
+    The ingest side (packets, frames, assembly latency) is only written by
+    the thread that receives datagrams, and the paint latency and skipped
+    frames only by the GUI thread.  There is no locking: a snapshot taken
+    while packets are arriving may be off by a packet or so, and reset(),
+    which runs on the GUI thread while the ingest thread keeps writing, is
+    approximate in the same way.
+
+    Histograms:
+        frame_interval:   time between consecutive complete frames
+        jitter:           change in frame_interval from one frame to the next
+        assembly_latency: first datagram of a frame ('B') to the last ('E')
+        paint_latency:    frame completion to the first paint showing it
+    """
+
+    HISTOGRAMS = ("frame_interval", "jitter", "assembly_latency",
+                  "paint_latency")
+
+    def __init__(self):
+        self.histograms = dict((name, Histogram()) for name in self.HISTOGRAMS)
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.packets = 0
+        self.bytes = 0
+        self.strand_packets = Counter()
+        self.malformed_packets = 0
+        self.late_packets = 0
+        self.duplicate_packets = 0
+        self.frames_completed = 0
+        self.frames_incomplete = 0
+        self.frames_dropped = 0
+        self.frames_skipped = 0
+        self._last_frame_time = None
+        self._last_interval = None
+        for h in self.histograms.values():
+            h.reset()
+
+    def packet_received(self, nbytes):
+        self.packets += 1
+        self.bytes += nbytes
+
+    def strand_received(self, strand):
+        self.strand_packets[strand] += 1
+
+    def frame_completed(self, started, completed):
+        """
+        Records a complete frame whose first datagram arrived at `started` and
+        last at `completed` (both perf_counter() times)
+        """
+        self.frames_completed += 1
+        self.histograms["assembly_latency"].record(completed - started)
+        if self._last_frame_time is not None:
+            interval = completed - self._last_frame_time
+            self.histograms["frame_interval"].record(interval)
+            if self._last_interval is not None:
+                self.histograms["jitter"].record(
+                    abs(interval - self._last_interval))
+            self._last_interval = interval
+        self._last_frame_time = completed
+
+    def frame_painted(self, completed, painted):
+        self.histograms["paint_latency"].record(painted - completed)
+
+    def snapshot(self):
+        """
+        Returns every metric as a JSON-serializable dict
+        """
+        elapsed = time.perf_counter() - self.started
+        rate = lambda n: 0.0 if elapsed <= 0 else round(n / elapsed, 2)
+        return {
+            "elapsed": round(elapsed, 3),
+            "packets": self.packets,
+            "packets_per_sec": rate(self.packets),
+            "bytes": self.bytes,
+            "strand_packets": dict((str(k), v) for k, v in
+                                   sorted(self.strand_packets.items())),
+            "malformed_packets": self.malformed_packets,
+            "late_packets": self.late_packets,
+            "duplicate_packets": self.duplicate_packets,
+            "frames_completed": self.frames_completed,
+            "frames_per_sec": rate(self.frames_completed),
+            "frames_incomplete": self.frames_incomplete,
+            "frames_dropped": self.frames_dropped,
+            "frames_skipped": self.frames_skipped,
+            "histograms": dict((name, h.snapshot()) for name, h in
+                               self.histograms.items()),
+        }
+
+    def summary(self):
+        """
+        Returns the packet and frame counts and the main latencies
+        """
+        s = self.snapshot()
+        h = s["histograms"]
+        return ("%d pkts (%d malformed, %d late), %d frames "
+                "(%d incomplete, %d dropped, %d skipped), interval p50 %.1f ms, "
+                "jitter p90 %.1f ms, assembly p90 %.1f ms, paint p90 %.1f ms" %
+                (s["packets"], s["malformed_packets"], s["late_packets"],
+                 s["frames_completed"], s["frames_incomplete"],
+                 s["frames_dropped"], s["frames_skipped"],
+                 h["frame_interval"]["p50"],
+                 h["jitter"]["p90"], h["assembly_latency"]["p90"],
+                 h["paint_latency"]["p90"]))
@@ -0,0 +1,252 @@
+"""
+Versioned binary frame protocol.
+
+The legacy protocol sends a 'B' datagram, one 'S' datagram per strand and an
+'E' datagram for every frame, with nothing tying them together.  In this
+protocol each datagram carries a frame ID, its chunk index and the number of
+chunks in the frame, and may pack the data for several strands (or a piece of
+one long strand).  The receiver only passes on frames for which every chunk
+has arrived.
+
+All integers are little-endian.  Datagram layout:
+
+    header (12 bytes):
+        magic        char     'F'
+        version      uint8    PROTOCOL_VERSION
+        num_records  uint8    strand records that follow
+        (padding)    1 byte
+        frame_id     uint32   increments by one per frame, wrapping
+        chunk_index  uint16   0 .. chunk_count - 1
+        chunk_count  uint16   datagrams making up this frame
+
+    then num_records records, each:
+        strand       uint8
+        (padding)    1 byte
+        offset       uint16   byte offset of this data within the strand
+        length       uint16   bytes of strand data that follow
+        data         `length` bytes of RGB888 pixel data
+"""
+import struct
+import time
+
+import numpy as np
+
+PROTOCOL_MAGIC = b'F'
+PROTOCOL_VERSION = 1
+
+HEADER = struct.Struct("<cBBxIHH")
+RECORD = struct.Struct("<BxHH")
+
+# Keeps every datagram inside a single Ethernet frame
+DEFAULT_MAX_DATAGRAM = 1472
+
+FRAME_ID_MASK = 0xFFFFFFFF
+
+# A frame ID this far behind the last completed frame is taken to mean that
+# the sender restarted, rather than that the datagram is late.
+RESYNC_DISTANCE = 256
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def frame_id_newer(a, b):
+    """
+    True if frame ID `a` comes after `b`, allowing for wraparound
+    """
+    return a != b and ((a - b) & FRAME_ID_MASK) < 0x80000000
+
+
+def pack_frame(frame_id, strands, max_datagram=DEFAULT_MAX_DATAGRAM):
+    """
+    Encodes one frame as a list of datagrams.
+
+    `strands` maps strand number to its RGB888 data (bytes or a uint8 array).
+    As many strands as fit are packed into each datagram; strands too long for
+    one datagram are split across several.
+    """
+    max_payload = max_datagram - HEADER.size - RECORD.size
+    if max_payload < 3:
+        raise ValueError("max_datagram is too small")
+
+    chunks = []
+    records = []
+    space = max_datagram - HEADER.size
+    for strand in sorted(strands):
+        data = memoryview(np.ascontiguousarray(strands[strand],
+                                               dtype=np.uint8)).cast('B')
+        if len(data) > 0xFFFF:
+            raise ValueError("strand %d has too much data" % strand)
+        offset = 0
+        while True:
+            if space < RECORD.size + min(len(data) - offset, 3):
+                chunks.append(records)
+                records = []
+                space = max_datagram - HEADER.size
+            length = min(len(data) - offset, space - RECORD.size)
+            records.append((strand, offset, data[offset:offset + length]))
+            space -= RECORD.size + length
+            offset += length
+            if offset >= len(data):
+                break
+    if records or not chunks:
+        chunks.append(records)
+
+    frame_id &= FRAME_ID_MASK
+    datagrams = []
+    for index, records in enumerate(chunks):
+        parts = [HEADER.pack(PROTOCOL_MAGIC, PROTOCOL_VERSION, len(records),
+                             frame_id, index, len(chunks))]
+        for strand, offset, data in records:
+            parts.append(RECORD.pack(strand, offset, len(data)))
+            parts.append(data)
+        datagrams.append(b''.join(parts))
+    return datagrams
+
+
+def unpack_header(packet):
+    """
+    Returns (num_records, frame_id, chunk_index, chunk_count).
+    Raises ProtocolError if the header is invalid.
+    """
+    if len(packet) < HEADER.size:
+        raise ProtocolError("Short datagram of length %d" % len(packet))
+    magic, version, num_records, frame_id, chunk_index, chunk_count = \
+        HEADER.unpack_from(packet)
+    if magic != PROTOCOL_MAGIC:
+        raise ProtocolError("Bad magic %r" % magic)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError("Unsupported protocol version %d" % version)
+    if chunk_index >= chunk_count:
+        raise ProtocolError("Chunk index %d out of range (%d chunks)" %
+                            (chunk_index, chunk_count))
+    return num_records, frame_id, chunk_index, chunk_count
+
+
+def iter_records(packet, num_records):
+    """
+    Yields (strand, offset, data) for each record in a datagram, where data is
+    a uint8 view of the datagram.  Raises ProtocolError if a record runs past
+    the end of the datagram.
+    """
+    pos = HEADER.size
+    for _ in range(num_records):
+        if pos + RECORD.size > len(packet):
+            raise ProtocolError("Truncated record header")
+        strand, offset, length = RECORD.unpack_from(packet, pos)
+        pos += RECORD.size
+        if pos + length > len(packet):
+            raise ProtocolError("Truncated record data for strand %d" % strand)
+        yield strand, offset, np.frombuffer(packet, dtype=np.uint8,
+                                            count=length, offset=pos)
+        pos += length
+
+
+class FrameAssembler(object):
+    """
+    Rebuilds frames from protocol datagrams.
+
+    Frames are filled in as their chunks arrive, in any order, and handed back
+    from process() once every chunk has been seen.  Up to `max_pending` frames
+    can be in flight at once.  When a frame completes, any older frames still
+    pending are discarded, as are older frames pushed out by new ones beyond
+    `max_pending`; each of these counts towards `incomplete`.  Chunks of frames
+    older than the last completed frame are ignored and counted as `late`,
+    unless they are so much older that the sender must have restarted.
+
+    Frames are taken from, and discarded frames given back to, `pool`, which
+    must provide acquire() and release() like FrameQueue.
+    """
+
+    MAX_PENDING = 4
+
+    def __init__(self, pool, max_pending=MAX_PENDING):
+        self.pool = pool
+        self.max_pending = max_pending
+
+        self.completed = 0
+        self.incomplete = 0
+        self.late = 0
+        self.duplicates = 0
+
+        self._last_completed = None
+        # frame_id -> [frame, chunks received, chunk count, received flags]
+        self._pending = {}
+
+    def process(self, packet, on_record=None):
+        """
+        Handles one datagram.  Returns the assembled Frame if this datagram
+        completed one, otherwise None.  Raises ProtocolError on a malformed
+        datagram, in which case nothing is kept from it.
+
+        `on_record`, if given, is called with the strand number of every
+        record in a well-formed datagram.
+        """
+        num_records, frame_id, chunk_index, chunk_count = unpack_header(packet)
+        records = list(iter_records(packet, num_records))
+        if on_record is not None:
+            for strand, _, _ in records:
+                on_record(strand)
+
+        if self._last_completed is not None and \
+                not frame_id_newer(frame_id, self._last_completed):
+            if (self._last_completed - frame_id) & FRAME_ID_MASK < RESYNC_DISTANCE:
+                self.late += 1
+                return None
+            self.reset()
+
+        pending = self._pending.get(frame_id, None)
+        if pending is None:
+            self._make_room()
+            pending = [self.pool.acquire(), 0, chunk_count,
+                       bytearray(chunk_count)]
+            pending[0].started = time.perf_counter()
+            self._pending[frame_id] = pending
+        elif pending[2] != chunk_count:
+            raise ProtocolError("Frame %d chunk count changed from %d to %d" %
+                                (frame_id, pending[2], chunk_count))
+
+        frame, received, _, flags = pending
+        if flags[chunk_index]:
+            self.duplicates += 1
+            return None
+        flags[chunk_index] = 1
+
+        for strand, offset, data in records:
+            frame.write_strand(strand, offset, data)
+
+        pending[1] = received + 1
+        if pending[1] < chunk_count:
+            return None
+
+        del self._pending[frame_id]
+        self._last_completed = frame_id
+        self.completed += 1
+        for other in [f for f in self._pending
+                      if not frame_id_newer(f, frame_id)]:
+            self._discard(other)
+        return frame
+
+    def _make_room(self):
+        while len(self._pending) >= self.max_pending:
+            oldest = None
+            for frame_id in self._pending:
+                if oldest is None or frame_id_newer(oldest, frame_id):
+                    oldest = frame_id
+            self._discard(oldest)
+
+    def _discard(self, frame_id):
+        self.pool.release(self._pending.pop(frame_id)[0])
+        self.incomplete += 1
+
+    def reset_counters(self):
+        self.completed = 0
+        self.incomplete = 0
+        self.late = 0
+        self.duplicates = 0
+
+    def reset(self):
+        for frame_id in list(self._pending):
+            self.pool.release(self._pending.pop(frame_id)[0])
+        self._last_completed = None
@@ -0,0 +1,217 @@
+"""
+Offscreen rendering of frames to RGB images, without Qt or OpenGL.
+"""
+import os
+import struct
+import subprocess
+import zlib
+
+import numpy as np
+
+# Pixel size in scene units, as drawn by CanvasView
+POINT_SIZE = 10
+BLUR_FACTOR = 3
+
+
+# A rasterizer keeps the footprint of every point (one entry, 16 bytes, per
+# image pixel covered by each point) if there are at most this many entries.
+# Above that, e.g. for large point sizes with many pixels, it only keeps the
+# topmost point at each image pixel, and frames where some pixels have no
+# data are splatted from scratch, a chunk of this many entries at a time.
+MAX_FOOTPRINT_ENTRIES = 1 << 22
+
+
+class Rasterizer(object):
+    """
+    Splats scene pixels into an RGB image the way CanvasView draws them.
+
+    Each pixel is a square point `POINT_SIZE` scene units across (three
+    times that in blurred mode), scaled to the image like the canvas, and
+    later pixels are drawn over earlier ones.  Pixels whose alpha is zero
+    (no data received) are not drawn.
+
+    The footprint of every point is worked out once, when the rasterizer is
+    created, so rendering a frame is a couple of numpy gathers and scatters
+    (see MAX_FOOTPRINT_ENTRIES for the exception).
+    """
+
+    def __init__(self, positions, extents, size, blurred=False,
+                 background=(0, 0, 0)):
+        """
+        positions: (N, 2) pixel positions in scene space, in drawing order
+        extents:   (width, height) of the scene
+        size:      (width, height) of the output image
+        """
+        self.width, self.height = int(size[0]), int(size[1])
+        scale = min(self.width / extents[0], self.height / extents[1])
+        point_size = max(int(POINT_SIZE * scale), 1)
+        if blurred:
+            point_size *= BLUR_FACTOR
+        self.point_size = point_size
+        self.background = np.asarray(background, dtype=np.uint8)
+
+        positions = np.asarray(positions, dtype=np.float32).reshape((-1, 2))
+        self.num_points = len(positions)
+        canvas = positions * np.float32(scale)
+
+        # Like a GL point, cover the image pixels whose centers fall inside
+        # the point's square
+        self._corners = np.ceil(canvas - point_size / 2.0 - 0.5).astype(np.intp)
+        self._chunk = max(MAX_FOOTPRINT_ENTRIES // (point_size * point_size), 1)
+
+        if self.num_points * point_size * point_size > MAX_FOOTPRINT_ENTRIES:
+            self._pixels = self._points = None
+            self._top_pixels, self._top_points = \
+                self._splat(np.arange(self.num_points))
+            return
+
+        pixels, points = self._footprints(np.arange(self.num_points))
+
+        # Sort by image pixel, then by drawing order, so that the last entry
+        # for each image pixel is the point drawn on top
+        order = np.lexsort((points, pixels))
+        self._pixels = pixels[order]
+        self._points = points[order]
+        last = np.ones(len(self._pixels), dtype=bool)
+        last[:-1] = self._pixels[1:] != self._pixels[:-1]
+        self._top_pixels = self._pixels[last]
+        self._top_points = self._points[last]
+
+    def _footprints(self, points):
+        """
+        Returns (pixels, points): the flat image index of every image pixel
+        covered by each of `points`, and the point covering it
+        """
+        steps = np.arange(self.point_size, dtype=np.intp)
+        corners = self._corners[points]
+        xs = corners[:, 0, None, None] + steps[None, None, :]
+        ys = corners[:, 1, None, None] + steps[None, :, None]
+        xs, ys = np.broadcast_arrays(xs, ys)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        points = np.broadcast_to(points[:, None, None], xs.shape)
+        return (ys * self.width + xs)[inside], points[inside]
+
+    def _splat(self, points):
+        """
+        Returns (pixels, points): every image pixel covered by any of
+        `points`, and the one drawn on top there, working through the points
+        in chunks
+        """
+        top = np.full(self.width * self.height, -1, dtype=np.intp)
+        for start in range(0, len(points), self._chunk):
+            chunk_pixels, chunk_points = \
+                self._footprints(points[start:start + self._chunk])
+            # Points later in drawing order have higher indices
+            np.maximum.at(top, chunk_pixels, chunk_points)
+        pixels = np.flatnonzero(top >= 0)
+        return pixels, top[pixels]
+
+    def render(self, colors, out=None):
+        """
+        Renders one frame.  `colors` is an (N, 4) uint8 RGBA array in drawing
+        order (as filled by Canvas.gather_render_colors), or (N, 3) RGB to
+        draw every pixel.  Returns an (height, width, 3) uint8 image, written
+        into `out` if it is given.
+        """
+        if out is None:
+            out = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        flat = out.reshape((-1, 3))
+        flat[:] = self.background
+
+        colors = np.asarray(colors)
+        if colors.shape[1] == 3 or colors[:, 3].all():
+            flat[self._top_pixels] = colors[self._top_points, :3]
+            return out
+
+        if self._pixels is None:
+            pixels, points = self._splat(np.flatnonzero(colors[:, 3]))
+            flat[pixels] = colors[points, :3]
+            return out
+
+        visible = colors[self._points, 3] != 0
+        pixels = self._pixels[visible]
+        points = self._points[visible]
+        last = np.ones(len(pixels), dtype=bool)
+        last[:-1] = pixels[1:] != pixels[:-1]
+        flat[pixels[last]] = colors[points[last], :3]
+        return out
+
+
+def encode_png(image, level=1):
+    """
+    Encodes an (height, width, 3) uint8 image as PNG data
+    """
+    height, width = image.shape[:2]
+    # Each scanline is prefixed with filter type 0 (none)
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape((height, width * 3))
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data +
+                struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), level)),
+        chunk(b'IEND', b''),
+    ])
+
+
+class PNGSequenceWriter(object):
+    """
+    Writes images as numbered PNG files in a directory
+    """
+
+    def __init__(self, directory, pattern="frame_%06d.png", level=1):
+        self.directory = directory
+        self.pattern = pattern
+        self.level = level
+        self.count = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def write(self, image):
+        path = os.path.join(self.directory, self.pattern % self.count)
+        with open(path, "wb") as f:
+            f.write(encode_png(image, self.level))
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+class RawVideoWriter(object):
+    """
+    Writes images as raw rgb24 video, to a file, to stdout ("-"), or to the
+    stdin of a command such as:
+
+        ffmpeg -f rawvideo -pix_fmt rgb24 -s 640x480 -r 60 -i - out.mp4
+    """
+
+    def __init__(self, path=None, command=None):
+        if path is None and command is None:
+            raise ValueError("RawVideoWriter needs a path or a command")
+        self._process = None
+        self._close_stream = False
+        if command is not None:
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+            self._stream = self._process.stdin
+            self._close_stream = True
+        elif path == "-":
+            self._stream = os.fdopen(os.dup(1), "wb")
+            self._close_stream = True
+        else:
+            self._stream = open(path, "wb")
+            self._close_stream = True
+        self.count = 0
+
+    def write(self, image):
+        self._stream.write(np.ascontiguousarray(image).data)
+        self.count += 1
+
+    def close(self):
+        if self._close_stream:
+            self._stream.close()
+        if self._process is not None:
+            self._process.wait()
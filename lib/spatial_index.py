@@ -0,0 +1,84 @@
+import math
+
+from lib.geometry import hit_test_rect
+
+
+class GridIndex(object):
+    """
+    A uniform-grid spatial hash of axis-aligned rectangles.
+
+    Each item is registered in every cell its rect overlaps, so a point query
+    only looks at the handful of items sharing the point's cell.  Items can be
+    inserted, moved and removed individually.
+
+    Rects are (x, y, width, height), as returned by PixelGroup.bounding_box().
+    """
+
+    def __init__(self, cell_size=50):
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._item_cells = {}
+        self._item_rects = {}
+        self._item_order = {}
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self._item_rects)
+
+    def __contains__(self, item):
+        return item in self._item_rects
+
+    def _cell_range(self, rect):
+        x, y, w, h = rect
+        cs = self.cell_size
+        return (int(math.floor(x / cs)), int(math.floor(y / cs)),
+                int(math.floor((x + w) / cs)), int(math.floor((y + h) / cs)))
+
+    def insert(self, item, rect):
+        self._unlink(item)
+
+        x0, y0, x1, y1 = self._cell_range(rect)
+        cells = [(cx, cy) for cx in range(x0, x1 + 1)
+                 for cy in range(y0, y1 + 1)]
+        for cell in cells:
+            self._cells.setdefault(cell, set()).add(item)
+
+        self._item_cells[item] = cells
+        self._item_rects[item] = rect
+        if item not in self._item_order:
+            self._item_order[item] = self._next_order
+            self._next_order += 1
+
+    def update(self, item, rect):
+        """
+        Moves an item to a new rect.  Cheap if the rect still covers the same
+        cells.
+        """
+        old_rect = self._item_rects.get(item, None)
+        if old_rect is not None and \
+                self._cell_range(old_rect) == self._cell_range(rect):
+            self._item_rects[item] = rect
+        else:
+            self.insert(item, rect)
+
+    def remove(self, item):
+        self._unlink(item)
+        self._item_rects.pop(item, None)
+        self._item_order.pop(item, None)
+
+    def _unlink(self, item):
+        for cell in self._item_cells.pop(item, []):
+            items = self._cells[cell]
+            items.discard(item)
+            if len(items) == 0:
+                del self._cells[cell]
+
+    def query_point(self, pos):
+        """
+        Returns the items whose rect contains pos, in insertion order
+        """
+        cs = self.cell_size
+        cell = (int(math.floor(pos[0] / cs)), int(math.floor(pos[1] / cs)))
+        hits = [item for item in self._cells.get(cell, ())
+                if hit_test_rect(self._item_rects[item], pos)]
+        return sorted(hits, key=self._item_order.get)
@@ -0,0 +1,171 @@
+"""
+Named timing spans for the ingest and render stages.
+
+Spans are always on: timing one is two perf_counter() calls and a couple of
+array writes.  Each span keeps a rolling window of its most recent durations
+(for the on-canvas overlay) and a Histogram of every duration since the last
+reset (for dumps).
+
+    from lib.timing import timings
+
+    with timings.span("upload"):
+        ...
+
+Each span must only be recorded from one thread; different spans may be
+recorded from different threads.
+"""
+import logging as log
+import time
+
+import numpy as np
+
+from lib.net_metrics import Histogram, MetricsReport
+
+# Number of recent durations each span keeps for its rolling statistics
+WINDOW = 256
+
+# Stages timed by FireSim, in the order they happen to a frame:
+#   ingest:   decoding and assembling one datagram (network thread)
+#   assemble: copying a complete frame into the canvas color buffer
+#   upload:   gathering pixel colors and uploading them to the GPU
+#   draw:     the GL draw call for the pixels
+#   chrome:   QPainter drawing of pixel group outlines, handles and overlay
+#   paint:    the whole of CanvasView.paint()
+STAGES = ("ingest", "assemble", "upload", "draw", "chrome", "paint")
+
+
+class SpanStats(object):
+    """
+    Durations recorded for one span
+    """
+
+    def __init__(self, window=WINDOW):
+        self.recent = np.zeros(window, dtype=np.float64)
+        self.histogram = Histogram()
+        self._next = 0
+        self._filled = 0
+
+    def record(self, seconds):
+        self.recent[self._next] = seconds
+        self._next = (self._next + 1) % len(self.recent)
+        if self._filled < len(self.recent):
+            self._filled += 1
+        self.histogram.record(seconds)
+
+    def reset(self):
+        self._next = 0
+        self._filled = 0
+        self.histogram.reset()
+
+    def rolling(self):
+        """
+        Returns (mean, p90, max) of the recent window, in seconds
+        """
+        if self._filled == 0:
+            return 0.0, 0.0, 0.0
+        recent = self.recent[:self._filled]
+        return (float(recent.mean()), float(np.percentile(recent, 90)),
+                float(recent.max()))
+
+
+class _Span(object):
+
+    __slots__ = ("stats", "start")
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.record(time.perf_counter() - self.start)
+        return False
+
+
+class Timings(MetricsReport):
+    """
+    A set of named spans.  Spans are created the first time they are used.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.spans = {}
+        self._started = time.perf_counter()
+
+    def stats(self, name):
+        try:
+            return self.spans[name]
+        except KeyError:
+            stats = self.spans[name] = SpanStats(self.window)
+            return stats
+
+    def span(self, name):
+        """
+        Returns a context manager that records the time spent inside it
+        """
+        return _Span(self.stats(name))
+
+    def record(self, name, seconds):
+        self.stats(name).record(seconds)
+
+    def reset(self):
+        self._started = time.perf_counter()
+        for stats in self.spans.values():
+            stats.reset()
+
+    def names(self):
+        """
+        Returns the span names, FireSim's stages first
+        """
+        # Spans may be added from another thread while this runs
+        names = list(self.spans)
+        return ([name for name in STAGES if name in names] +
+                sorted(name for name in names if name not in STAGES))
+
+    def overlay_lines(self):
+        """
+        Returns a heading and one short line of rolling statistics per span
+        """
+        lines = []
+        if self.spans:
+            lines.append("%-8s %6s / %6s / %6s" % ("", "mean", "p90", "max"))
+        for name in self.names():
+            mean, p90, peak = self.spans[name].rolling()
+            lines.append("%-8s %6.2f / %6.2f / %6.2f ms" %
+                         (name, mean * 1000, p90 * 1000, peak * 1000))
+        return lines
+
+    def snapshot(self):
+        """
+        Returns every span's histogram as a JSON-serializable dict
+        """
+        return {
+            "elapsed": round(time.perf_counter() - self._started, 3),
+            "spans": dict((name, self.spans[name].histogram.snapshot())
+                          for name in self.names()),
+        }
+
+    def summary(self):
+        """
+        Returns the count, mean and p90 of every span
+        """
+        parts = []
+        for name in self.names():
+            h = self.spans[name].histogram
+            parts.append("%s %d x %.2f ms (p90 %.2f ms)" %
+                         (name, h.count, h.mean() * 1000,
+                          h.percentile(90) * 1000))
+        return ", ".join(parts)
+
+    def dump(self, path=None):
+        """
+        Logs a summary, and writes the full snapshot to `path` if given
+        """
+        log.warning("Timing: %s" % self.summary())
+        if path is not None:
+            self.write_json(path)
+
+
+timings = Timings()
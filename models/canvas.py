@@ -1,5 +1,9 @@
+import numpy as np
+
 from PyQt5.QtCore import pyqtProperty, pyqtSignal, pyqtSlot, QObject
 
+from lib.buffer_utils import BufferUtils
+
 
 class Canvas(QObject):
 
@@ -9,7 +13,15 @@ class Canvas(QObject):
         super(Canvas, self).__init__()
 
         self.scene = None
-        self.color_data = {}
+
+        # Latest pixel colors for the whole scene as RGBA, indexed like
+        # BufferUtils.  Alpha is 255 for pixels that have received data and 0
+        # for the rest.  render_index maps the scene's pixel-group order (the
+        # order pixels are drawn in) to buffer indices.
+        self.color_buffer = np.zeros((0, 4), dtype=np.uint8)
+        self.render_index = np.zeros(0, dtype=np.intp)
+        self._strand_offsets = np.zeros(1, dtype=np.intp)
+        self._color_buffer_version = None
 
         # The canvas is always in either design mode or sim mode.
         # In design mode, pixel colors are not drawn, and object manipulation
@@ -18,6 +30,83 @@ class Canvas(QObject):
 
         self._blurred = False
 
+    def update_color_buffer(self):
+        """
+        Resizes and clears the color buffer to fit the scene's strands, and
+        rebuilds the render index.  Does nothing unless the scene's addressing
+        has changed since the last call.
+        """
+        if self.scene is None or \
+                self._color_buffer_version == self.scene.address_version:
+            return
+        self._color_buffer_version = self.scene.address_version
+
+        BufferUtils.init(self.scene)
+        # Colors received for the old layout are at the wrong indices now
+        if len(self.color_buffer) != BufferUtils.get_buffer_size():
+            self.color_buffer = np.zeros((BufferUtils.get_buffer_size(), 4),
+                                         dtype=np.uint8)
+        else:
+            self.color_buffer[:] = 0
+        self._strand_offsets = np.zeros(BufferUtils.num_strands + 1,
+                                        dtype=np.intp)
+        for strand in range(BufferUtils.num_strands):
+            self._strand_offsets[strand + 1] = \
+                BufferUtils.get_strand_extents(strand)[1]
+
+        groups = self.scene.pixel_groups
+        counts = np.array([pg.count for pg in groups], dtype=np.intp)
+        bases = np.array([self._strand_offsets[pg.strand] + pg.offset
+                          for pg in groups], dtype=np.intp)
+        starts = np.cumsum(counts) - counts
+        self.render_index = (np.repeat(bases - starts, counts) +
+                             np.arange(counts.sum(), dtype=np.intp))
+
+    def set_strand_colors(self, strand, data):
+        """
+        Copies received RGB888 data (a uint8 array, bytes or list) for one
+        strand into the color buffer.  Data beyond the end of the strand, and
+        strands the scene doesn't have, are ignored.
+        """
+        if strand < 0 or strand >= len(self._strand_offsets) - 1:
+            return
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = np.frombuffer(data, dtype=np.uint8)
+        else:
+            data = np.asarray(data, dtype=np.uint8)
+        start = self._strand_offsets[strand]
+        end = self._strand_offsets[strand + 1]
+        n = min(len(data) // 3, end - start)
+        self.color_buffer[start:start + n, :3] = \
+            np.reshape(data[:n * 3], (-1, 3))
+        self.color_buffer[start:start + n, 3] = 255
+        self.color_buffer[start + n:end, 3] = 0
+
+    def set_frame(self, frame):
+        """
+        Copies a frame (a dict of strand number to RGB888 data) into the color
+        buffer
+        """
+        self.update_color_buffer()
+        for strand, data in frame.items():
+            self.set_strand_colors(strand, data)
+
+    def strand_colors(self, strand):
+        """
+        Returns an (N, 3) view of the colors of one strand
+        """
+        start = self._strand_offsets[strand]
+        return self.color_buffer[start:self._strand_offsets[strand + 1], :3]
+
+    def gather_render_colors(self, out):
+        """
+        Fills `out`, an (N, 4) uint8 array, with the RGBA color of every pixel
+        in drawing order, in a single gather
+        """
+        np.take(self.color_buffer.view(np.uint32).reshape(-1),
+                self.render_index, out=out.view(np.uint32).reshape(-1))
+        return out
+
     @pyqtProperty(bool, notify=changed)
     def design_mode(self):
         return self._design_mode
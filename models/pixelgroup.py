@@ -4,9 +4,10 @@ import numpy as np
 from PyQt5.QtCore import (pyqtProperty, pyqtSignal, pyqtSlot, QObject, QPoint,
                           QPointF)
 
+from lib.buffer_utils import struct_flat
 from lib.dtypes import pixel_color, pixel_location
 from lib.geometry import (distance, distance_point_to_line, inflate_rect,
-                          vec2_sum)
+                          points_along_line, vec2_sum)
 
 __all__ = [
     "PixelGroup", "LinearPixelGroup", "RectangularPixelGroup",
@@ -77,6 +78,9 @@ class PixelGroup(QObject):
         self._strand = strand
         self._offset = offset
 
+        self.pixel_locations = np.zeros(count, dtype=pixel_location)
+        self.pixel_colors = np.zeros(count, dtype=pixel_color)
+
         # GUI-related
         self.selected = False
         self.draw_bb = False
@@ -88,6 +92,12 @@ class PixelGroup(QObject):
 
     changed = pyqtSignal()
 
+    # Emitted whenever pixel_locations has been recomputed
+    geometry_changed = pyqtSignal()
+
+    # Emitted when the strand, offset or count changes
+    address_changed = pyqtSignal()
+
     def __repr__(self):
         return "PixelGroup address (%d, %d)" % (self.strand, self.offset)
 
@@ -101,6 +111,8 @@ class PixelGroup(QObject):
             self._count = val
             self.pixel_locations = np.zeros(self._count, dtype=pixel_location)
             self.pixel_colors = np.zeros(self.count, dtype=pixel_color)
+            self._update_geometry()
+            self.address_changed.emit()
 
     @pyqtProperty(int, notify=changed)
     def strand(self):
@@ -110,6 +122,7 @@ class PixelGroup(QObject):
     def strand(self, val):
         if self._strand != val and val > 0:
             self._strand = val
+            self.address_changed.emit()
 
     @pyqtProperty(int, notify=changed)
     def offset(self):
@@ -119,11 +132,25 @@ class PixelGroup(QObject):
     def offset(self, val):
         if self._offset != val and val > 0:
             self._offset = val
+            self.address_changed.emit()
 
     @property
     def drag_delta(self):
         return self._drag_delta
 
+    def _update_geometry(self):
+        """
+        Recomputes pixel_locations (in scene space) and emits geometry_changed
+        """
+        raise NotImplementedError("Please override _update_geometry()!")
+
+    def _set_pixel_locations(self, points):
+        """
+        Stores a (count, 2) array of points (e.g. from
+        lib.geometry.points_along_line) into pixel_locations in one step.
+        """
+        struct_flat(self.pixel_locations).reshape((-1, 2))[:] = points
+
     def bounding_box(self):
         """
         Returns a bounding box that encompasses the pixels in the group
@@ -185,6 +212,10 @@ class LinearPixelGroup(PixelGroup):
                  strand=0, offset=0, json=None):
 
         super(LinearPixelGroup, self).__init__(count, strand, offset)
+        self.start_handle = Handle(self, start)
+        self.end_handle = Handle(self, end)
+        self._bounding_box = None
+
         if json is not None:
             self.from_json(json)
         else:
@@ -194,10 +225,6 @@ class LinearPixelGroup(PixelGroup):
             self.strand = strand
             self.offset = offset
 
-        self.start_handle = Handle(self, self.start)
-        self.end_handle = Handle(self, self.end)
-
-        self._bounding_box = None
         self._update_geometry()
 
     changed = pyqtSignal()
@@ -256,19 +283,18 @@ class LinearPixelGroup(PixelGroup):
         return d
 
     def _update_geometry(self):
-        if self.count > 0:
-            ox = (self.end[0] - self.start[0]) / self.count
-            oy = (self.end[1] - self.start[1]) / self.count
-            px, py = self.start[0], self.start[1]
-            for i in range(self.count):
-                self.pixel_locations[i] = (px, py)
-                px += ox
-                py += oy
+        self._set_pixel_locations(points_along_line(self.start, self.end,
+                                                    self.count))
         self._bounding_box = None
 
         # TODO: It would be nice if Handles updated automatically
-        self.start_handle.pos = self.start
-        self.end_handle.pos = self.end
+        # While the whole group is being dragged, the handles already follow
+        # the drag delta on their own.
+        if not self.dragging:
+            self.start_handle.pos = self.start
+            self.end_handle.pos = self.end
+
+        self.geometry_changed.emit()
 
     def bounding_box(self):
         if self._bounding_box is None:
@@ -311,6 +337,7 @@ class LinearPixelGroup(PixelGroup):
             self.end_handle.pos = self.end
         else:
             self._drag_delta = delta_pos
+        self._update_geometry()
 
     def on_drag_end(self, delta_pos):
         if self.dragging:
@@ -339,6 +366,7 @@ class LinearPixelGroup(PixelGroup):
             self.dragging = False
             self._drag_start_pos = None
             self._drag_delta = None
+        self._update_geometry()
 
 
 class RectangularPixelGroup(PixelGroup):
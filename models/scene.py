@@ -16,6 +16,9 @@
 # along with Firemix.  If not, see <http://www.gnu.org/licenses/>.
 
 from builtins import range
+from past.utils import old_div
+from collections import OrderedDict
+import itertools
 import os
 import math
 import logging
@@ -26,10 +29,15 @@ from PyQt5.QtCore import (pyqtProperty, pyqtSignal, pyqtSlot)
 
 from lib.json_dict import JSONDict
 from lib.buffer_utils import BufferUtils
+from lib.spatial_index import GridIndex
 from models.pixelgroup import LinearPixelGroup
 
 log = logging.getLogger("firemix.lib.scene")
 
+# Scene geometry versions are unique across resets, so a cache keyed on one
+# can never confuse a reloaded scene with the one it replaced.
+_geometry_versions = itertools.count()
+
 class Scene(JSONDict):
     """
     The scene file holds all the data related to pixel positioning and other
@@ -71,6 +79,9 @@ class Scene(JSONDict):
 
     changed = pyqtSignal()
 
+    # Rows of get_pixel_distances() kept around; memory is rows * N * 4 bytes
+    PIXEL_DISTANCE_CACHE_ROWS = 256
+
     def __init__(self, filepath=None):
         self._reset()
         super(Scene, self).__init__('scene', filepath, True)
@@ -80,16 +91,26 @@ class Scene(JSONDict):
         self._fixture_dict = {}
         self._fixture_hierarchy = None
         self._colliding_fixtures_cache = {}
-        self._pixel_neighbors_cache = {}
+        self._neighbor_indptr = None
+        self._neighbor_indices = None
+        self._neighbor_distances = None
+        self._neighbor_radius = None
         self._pixel_locations_cache = {}
-        self._pixel_distance_cache = {}
         self._intersection_points = None
+        self._endpoint_index = None
+        self._endpoint_index_version = None
         self._all_pixels = None
         self._all_pixel_locations = None
         self._all_pixels_raw = None
         self._strand_settings = None
         self._tree = None
+        self._pixel_distances_cache = OrderedDict()
         self._pixel_groups = []
+        self._geometry_version = next(_geometry_versions)
+        self._address_version = next(_geometry_versions)
+        self._pixel_group_locations = None
+        self._pixel_group_spans = None
+        self._pixel_group_index = None
 
     def generate_new_data(self):
         self.data['file-type'] = "scene"
@@ -137,25 +158,12 @@ class Scene(JSONDict):
         for strand in fh:
             for fixture in fh[strand]:
                 self.get_colliding_fixtures(strand, fixture)
-                for pixel in range(self.fixture(strand, fixture).pixels):
-                    index = BufferUtils.logical_to_index((strand, fixture, pixel))
-                    neighbors = self.get_pixel_neighbors(index)
-                    self.get_pixel_location(index)
-                    for neighbor in neighbors:
-                        self.get_pixel_distance(index, neighbor)
+        self.get_all_pixels_logical()
+        self._tree = spatial.cKDTree(self.get_all_pixel_locations())
+        self.build_neighbor_graph()
         self.get_fixture_bounding_box()
         self.get_intersection_points()
-        self.get_all_pixels_logical()
-        self._tree = spatial.KDTree(self.get_all_pixel_locations())
-
-        locations = self.get_all_pixel_locations()
-        self.pixelDistances = np.empty([len(locations), len(locations)])
-
-        for pixel in range(len(locations)):
-            cx, cy = locations[pixel]
-            x,y = (locations - (cx, cy)).T
-            pixel_distances = np.sqrt(np.square(x) + np.square(y))
-            self.pixelDistances[pixel] = pixel_distances
+        self._pixel_distances_cache.clear()
 
         log.info("Done")
 
@@ -217,8 +225,134 @@ class Scene(JSONDict):
     @pixel_groups.setter
     def pixel_groups(self, pixel_groups):
         self._pixel_groups = pixel_groups
+        for pg in pixel_groups:
+            pg.geometry_changed.connect(self._on_pixel_group_geometry_changed)
+            pg.address_changed.connect(self._on_pixel_group_address_changed)
+        self._pixel_group_index = None
+        self._on_pixel_group_geometry_changed()
+        self._on_pixel_group_address_changed()
         self.dirty = True
 
+    @property
+    def geometry_version(self):
+        """
+        Changes whenever any pixel group moves or changes shape, or the scene
+        is reloaded.  Used to invalidate geometry caches.
+        """
+        return self._geometry_version
+
+    @property
+    def address_version(self):
+        """
+        Changes whenever a pixel group is added or removed, or changes its
+        strand, offset or pixel count.  Used to invalidate addressing caches
+        (such as the BufferUtils tables).
+        """
+        return self._address_version
+
+    def add_pixel_group(self, pg):
+        pg.geometry_changed.connect(self._on_pixel_group_geometry_changed)
+        pg.address_changed.connect(self._on_pixel_group_address_changed)
+        self._pixel_groups.append(pg)
+        if self._pixel_group_index is not None:
+            self._pixel_group_index.insert(pg, pg.bounding_box())
+        self._on_pixel_group_geometry_changed()
+        self._on_pixel_group_address_changed()
+        self.dirty = True
+
+    def remove_pixel_group(self, pg):
+        pg.geometry_changed.disconnect(self._on_pixel_group_geometry_changed)
+        pg.address_changed.disconnect(self._on_pixel_group_address_changed)
+        self._pixel_groups.remove(pg)
+        if self._pixel_group_index is not None:
+            self._pixel_group_index.remove(pg)
+        self._on_pixel_group_geometry_changed()
+        self._on_pixel_group_address_changed()
+        self.dirty = True
+
+    @pyqtSlot()
+    def _on_pixel_group_address_changed(self):
+        self._address_version = next(_geometry_versions)
+        self._fixture_hierarchy = None
+        # These are all in buffer order
+        self._all_pixels = None
+        self._all_pixels_raw = None
+        self._clear_location_caches()
+        self._clear_neighbor_graph()
+
+    @pyqtSlot()
+    def _on_pixel_group_geometry_changed(self):
+        self._geometry_version = next(_geometry_versions)
+        self._pixel_group_locations = None
+        self._pixel_group_spans = None
+        self._clear_location_caches()
+        self._clear_neighbor_graph()
+
+        pg = self.sender()
+        if self._pixel_group_index is not None and pg is not None:
+            self._pixel_group_index.update(pg, pg.bounding_box())
+
+    def _clear_location_caches(self):
+        """
+        Drops the per-pixel location and distance caches, which depend on
+        both the geometry and the addressing
+        """
+        self._all_pixel_locations = None
+        self._pixel_locations_cache = {}
+        self._pixel_distances_cache.clear()
+
+    def _clear_neighbor_graph(self):
+        """
+        Drops the KD-tree and neighbor graph.  A graph that had been built is
+        rebuilt, with the same radius, the next time it is asked for.
+        """
+        self._tree = None
+        self._neighbor_indptr = None
+        self._neighbor_indices = None
+        self._neighbor_distances = None
+
+    def get_pixel_groups_at(self, pos):
+        """
+        Returns the pixel groups whose bounding box contains pos (in scene
+        space), in scene order.  Backed by a grid index that is kept up to
+        date as groups move, so this does not scan every group.
+        """
+        if self._pixel_group_index is None:
+            self._pixel_group_index = GridIndex()
+            for pg in self.pixel_groups:
+                self._pixel_group_index.insert(pg, pg.bounding_box())
+        return self._pixel_group_index.query_point(pos)
+
+    def get_pixel_group_locations(self):
+        """
+        Returns a contiguous (N, 2) float32 array of the scene-space location
+        of every pixel in every pixel group, in pixel group order.  The array
+        is cached until the scene geometry changes and must not be modified.
+        """
+        if self._pixel_group_locations is None:
+            locations = np.zeros((sum(pg.count for pg in self.pixel_groups), 2),
+                                 dtype=np.float32)
+            spans = []
+            start = 0
+            for pg in self.pixel_groups:
+                end = start + pg.count
+                locations[start:end, 0] = pg.pixel_locations['x']
+                locations[start:end, 1] = pg.pixel_locations['y']
+                spans.append((pg, start, end))
+                start = end
+            self._pixel_group_locations = locations
+            self._pixel_group_spans = spans
+        return self._pixel_group_locations
+
+    def get_pixel_group_spans(self):
+        """
+        Returns a list of (pixel_group, start, end) tuples giving the rows of
+        get_pixel_group_locations() that belong to each pixel group.
+        """
+        if self._pixel_group_spans is None:
+            self.get_pixel_group_locations()
+        return self._pixel_group_spans
+
     @property
     def backdrop_enable(self):
         return self.data.get("backdrop-enable")
@@ -237,6 +371,40 @@ class Scene(JSONDict):
         self.data["backdrop-filename"] = path
         self.dirty = True
 
+    def fixtures(self):
+        """
+        Returns every pixel group.  The scene analysis methods below come from
+        FireMix, which calls pixel groups fixtures.
+        """
+        return self.pixel_groups
+
+    def fixture_hierarchy(self):
+        """
+        Returns a dict of {strand: {fixture: pixel_group}}, where fixture is
+        the index of the group along its strand, ordered by offset.  These are
+        the (strand, fixture, pixel) logical addresses used by BufferUtils.
+        """
+        if self._fixture_hierarchy is None:
+            fh = {}
+            self._fixture_dict = {}
+            for pg in sorted(self.pixel_groups,
+                             key=lambda pg: (pg.strand, pg.offset)):
+                fixtures = fh.setdefault(pg.strand, {})
+                self._fixture_dict[pg] = (pg.strand, len(fixtures))
+                fixtures[len(fixtures)] = pg
+            self._fixture_hierarchy = fh
+        return self._fixture_hierarchy
+
+    def fixture(self, strand, address):
+        return self.fixture_hierarchy()[strand][address]
+
+    def fixture_address(self, pg):
+        """
+        Returns the (strand, fixture) address of a pixel group
+        """
+        self.fixture_hierarchy()
+        return self._fixture_dict[pg]
+
     def get_matrix_extents(self):
         """
         Returns a tuple of (strands, pixels) indicating the maximum extents needed
@@ -247,7 +415,7 @@ class Scene(JSONDict):
         strands = len(fh)
         longest_strand = 0
         for strand in fh:
-            strand_len = sum([fh[strand][f].pixels for f in fh[strand]])
+            strand_len = sum([fh[strand][f].count for f in fh[strand]])
             longest_strand = max(strand_len, longest_strand)
 
         return (strands, longest_strand)
@@ -263,53 +431,105 @@ class Scene(JSONDict):
         f = self.fixture(strand, address)
 
         if loc == 'start':
-            center = f.pos1
+            center = f.start
         elif loc == 'end':
-            center = f.pos2
+            center = f.end
         elif loc == 'midpoint':
-            center = f.midpoint()
+            center = ((f.start[0] + f.end[0]) / 2.0,
+                      (f.start[1] + f.end[1]) / 2.0)
         else:
             raise ValueError("loc must be one of 'start', 'end', 'midpoint'")
 
+        endpoints, tree = self._get_endpoint_index()
         colliding = self._colliding_fixtures_cache.get((strand, address, loc), None)
 
         if colliding is None:
             colliding = []
-            r2 = pow(radius, 2)
-            x1, y1 = center
-            for tf in self.fixtures():
-                # Match start point
-                x2, y2 = tf.pos1
-                if pow(x2 - x1, 2) + pow(y2 - y1, 2) <= r2:
-                    #print tf, "collides with", strand, address
-                    colliding.append((tf.strand, tf.address, 0))
-                    continue
-                    # Match end point
-                x2, y2 = tf.pos2
-                if pow(x2 - x1, 2) + pow(y2 - y1, 2) <= r2:
-                    #print tf, "collides with", strand, address, "backwards"
-                    colliding.append((tf.strand, tf.address, tf.pixels - 1))
+            hits = set(tree.query_ball_point(center, radius))
+            fixtures = self.fixtures()
+            # Endpoint 2i is the start of fixture i and 2i + 1 is its end
+            for i in sorted(set(hit // 2 for hit in hits)):
+                tf = fixtures[i]
+                tf_strand, tf_address = self.fixture_address(tf)
+                if 2 * i in hits:
+                    colliding.append((tf_strand, tf_address, 0))
+                else:
+                    colliding.append((tf_strand, tf_address, tf.count - 1))
 
             self._colliding_fixtures_cache[(strand, address, loc)] = colliding
 
         return colliding
 
-    def get_pixel_neighbors(self, index):
+    def build_neighbor_graph(self, radius=3):
+        """
+        Finds every pair of pixels within radius of each other in one KD-tree
+        query, and stores the result as a CSR adjacency: the neighbors of
+        pixel i are indices[indptr[i]:indptr[i + 1]] (sorted, and including i
+        itself), with matching entries in distances.
+        """
+        if self._tree is None:
+            self._tree = spatial.cKDTree(self.get_all_pixel_locations())
+        locations = self._tree.data
+        n = len(locations)
+
+        pairs = self._tree.query_pairs(radius, output_type='ndarray')
+        diagonal = np.arange(n)
+        rows = np.concatenate((diagonal, pairs[:, 0], pairs[:, 1]))
+        cols = np.concatenate((diagonal, pairs[:, 1], pairs[:, 0]))
+        order = np.lexsort((cols, rows))
+        rows = rows[order]
+        cols = cols[order]
+
+        indptr = np.zeros(n + 1, dtype=np.intp)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+        delta = locations[rows] - locations[cols]
+        distances = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+
+        self._neighbor_indptr = indptr
+        self._neighbor_indices = cols
+        self._neighbor_distances = distances.astype(np.float32)
+        self._neighbor_radius = radius
+
+    def _has_neighbor_graph(self):
         """
-        Returns a list of pixel addresses that are adjacent to the given address.
+        Returns True if the neighbor graph is available, rebuilding it first
+        if the scene has changed since it was built
         """
+        if self._neighbor_indptr is None and self._neighbor_radius is not None:
+            self.build_neighbor_graph(self._neighbor_radius)
+        return self._neighbor_indptr is not None
 
-        neighbors = self._pixel_neighbors_cache.get(index, None)
+    def get_neighbor_graph(self):
+        """
+        Returns the (indptr, indices, distances) arrays built by
+        build_neighbor_graph(), or None if warmup() has not been run.
+        """
+        if not self._has_neighbor_graph():
+            return None
+        return (self._neighbor_indptr, self._neighbor_indices,
+                self._neighbor_distances)
 
-        if neighbors is None:
-            neighbors = []
-            if self._tree:
-                neighbors = self._tree.query_ball_point(self.get_pixel_location(index), 3)
-                # if len(neighbors) > 4:
-                #     print index, neighbors
-                self._pixel_neighbors_cache[index] = neighbors
+    def get_pixel_neighbors(self, index):
+        """
+        Returns an array of pixel addresses that are adjacent to the given
+        address (including the address itself).  Empty until warmup() has
+        been run.
+        """
+        if not self._has_neighbor_graph():
+            return []
+        return self._neighbor_indices[self._neighbor_indptr[index]:
+                                      self._neighbor_indptr[index + 1]]
 
-        return neighbors
+    def get_pixel_neighbor_distances(self, index):
+        """
+        Returns the distances to each of get_pixel_neighbors(index), in the
+        same order.
+        """
+        if not self._has_neighbor_graph():
+            return []
+        return self._neighbor_distances[self._neighbor_indptr[index]:
+                                        self._neighbor_indptr[index + 1]]
 
     def get_pixel_location(self, index):
         """
@@ -319,17 +539,18 @@ class Scene(JSONDict):
 
         if loc is None:
 
-            strand, address, pixel = BufferUtils.index_to_logical(index)
+            strand, address, pixel = BufferUtils.index_to_logical(index,
+                                                                  scene=self)
             f = self.fixture(strand, address)
 
             if pixel == 0:
-                loc = f.pos1
-            elif pixel == (f.pixels - 1):
-                loc = f.pos2
+                loc = f.start
+            elif pixel == (f.count - 1):
+                loc = f.end
             else:
-                x1, y1 = f.pos1
-                x2, y2 = f.pos2
-                scale = old_div(float(pixel), f.pixels)
+                x1, y1 = f.start
+                x2, y2 = f.end
+                scale = old_div(float(pixel), f.count)
                 relx, rely = ((x2 - x1) * scale, (y2 - y1) * scale)
                 loc = (x1 + relx, y1 + rely)
 
@@ -341,14 +562,10 @@ class Scene(JSONDict):
         """
         Calculates the distance (in scene coordinate units) between two pixels
         """
-        dist = self._pixel_distance_cache.get((first, second), None)
-        if dist is None:
-            first_loc = self.get_pixel_location(first)
-            second_loc = self.get_pixel_location(second)
-            dist = self.get_point_distance(first_loc, second_loc)
-            self._pixel_distance_cache[(first, second)] = dist
-            self._pixel_distance_cache[(second, first)] = dist
-        return dist
+        if self._all_pixel_locations is None:
+            self.get_all_pixel_locations()
+        dx, dy = self._all_pixel_locations[first] - self._all_pixel_locations[second]
+        return math.sqrt(dx * dx + dy * dy)
 
     def get_point_distance(self, first, second):
         return math.fabs(math.sqrt(math.pow(second[0] - first[0], 2) + math.pow(second[1] - first[1], 2)))
@@ -360,39 +577,74 @@ class Scene(JSONDict):
         if self._all_pixels is None:
             addresses = []
             for f in self.fixtures():
-                for pixel in range(f.pixels):
-                    addresses.append((f.strand, f.address, pixel))
+                strand, address = self.fixture_address(f)
+                for pixel in range(f.count):
+                    addresses.append((strand, address, pixel))
             self._all_pixels = addresses
         return self._all_pixels
 
     def get_pixel_distances(self, pixel):
-        return self.pixelDistances[pixel]
+        """
+        Returns a float32 array of the distances from the given pixel to every
+        pixel in the scene (in get_all_pixels() order).
+
+        Rows are computed on demand and the most recently used ones are kept,
+        so memory grows linearly with the number of pixels rather than with
+        its square.  The returned array must not be modified.
+        """
+        distances = self._pixel_distances_cache.get(pixel, None)
+        if distances is None:
+            if self._all_pixel_locations is None:
+                self.get_all_pixel_locations()
+            locations = self._all_pixel_locations
+            delta = (locations - locations[pixel]).astype(np.float32)
+            distances = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+            self._pixel_distances_cache[pixel] = distances
+            if len(self._pixel_distances_cache) > self.PIXEL_DISTANCE_CACHE_ROWS:
+                self._pixel_distances_cache.popitem(last=False)
+        else:
+            self._pixel_distances_cache.move_to_end(pixel)
+        return distances
 
     def get_all_pixels(self):
         """
         Returns a list of all pixels in buffer address format (strand, offset)
         """
         if self._all_pixels_raw is None:
-            all_pixels = []
-            for s, a, p in self.get_all_pixels_logical():
-                #pxs.append(BufferUtils.get_buffer_address((s, a, p), scene=self))
-                all_pixels.append(BufferUtils.logical_to_index((s, a, p), scene=self))
-            all_pixels = sorted(all_pixels)
-            self._all_pixels_raw = all_pixels
+            logical = np.array(self.get_all_pixels_logical(),
+                               dtype=np.int32).reshape((-1, 3))
+            indices = BufferUtils.logical_to_index_array(logical, scene=self)
+            self._all_pixels_raw = sorted(indices.tolist())
 
         return self._all_pixels_raw
 
+    def get_pixel_group_buffer_indices(self):
+        """
+        Returns the BufferUtils index of every row of
+        get_pixel_group_locations()
+        """
+        spans = self.get_pixel_group_spans()
+        if len(spans) == 0:
+            return np.zeros(0, dtype=np.intp)
+        logical = np.array([self.fixture_address(pg) + (0,)
+                            for pg, start, end in spans], dtype=np.intp)
+        bases = BufferUtils.logical_to_index_array(logical, scene=self)
+        starts = np.array([start for pg, start, end in spans], dtype=np.intp)
+        counts = np.array([end - start for pg, start, end in spans],
+                          dtype=np.intp)
+        return (np.repeat(bases - starts, counts) +
+                np.arange(int(counts.sum()), dtype=np.intp))
+
     def get_all_pixel_locations(self):
         """
-        Returns a numpy array of (x, y) pairs.
+        Returns a numpy array of (x, y) pairs, in get_all_pixels() order.
+        Built from get_pixel_group_locations() in one reordering gather.
         """
         if self._all_pixel_locations is None:
-            pixels = self.get_all_pixels()
-            pixel_location_list = []
-            for pixel in pixels:
-                pixel_location_list.append(self.get_pixel_location(pixel))
-
-            self._all_pixel_locations = np.asarray(pixel_location_list)
+            order = np.argsort(self.get_pixel_group_buffer_indices(),
+                               kind='stable')
+            self._all_pixel_locations = \
+                self.get_pixel_group_locations()[order].astype(np.float64)
         return np.copy(self._all_pixel_locations)
 
 
@@ -401,66 +653,59 @@ class Scene(JSONDict):
         Returns the bounding box containing all fixtures in the scene
         Return value is a tuple of (xmin, ymin, xmax, ymax)
         """
-        xmin = 999999
-        xmax = -999999
-        ymin = 999999
-        ymax = -999999
-
-        fh = self.fixture_hierarchy()
-        for strand in fh:
-            for fixture in fh[strand]:
-                for pixel in range(self.fixture(strand, fixture).pixels):
-                    x, y = self.get_pixel_location(BufferUtils.logical_to_index((strand, fixture, pixel)))
-                    if x < xmin:
-                        xmin = x
-                    if x > xmax:
-                        xmax = x
-                    if y < ymin:
-                        ymin = y
-                    if y > ymax:
-                        ymax = y
+        if self._all_pixel_locations is None:
+            self.get_all_pixel_locations()
+        if len(self._all_pixel_locations) == 0:
+            return (999999, 999999, -999999, -999999)
 
+        xmin, ymin = self._all_pixel_locations.min(axis=0).tolist()
+        xmax, ymax = self._all_pixel_locations.max(axis=0).tolist()
         return (xmin, ymin, xmax, ymax)
 
+    def _get_endpoint_index(self):
+        """
+        Returns a (2F, 2) array of fixture endpoints (start of fixture i at
+        row 2i, end at 2i + 1) and a KD-tree over them.  Rebuilt, along with
+        the collision and intersection caches, when the geometry changes.
+        """
+        if self._endpoint_index_version != self.geometry_version:
+            endpoints = np.zeros((2 * len(self.fixtures()), 2))
+            for i, f in enumerate(self.fixtures()):
+                endpoints[2 * i] = f.start
+                endpoints[2 * i + 1] = f.end
+            self._endpoint_index = (endpoints, spatial.cKDTree(endpoints))
+            self._endpoint_index_version = self.geometry_version
+            self._colliding_fixtures_cache = {}
+            self._intersection_points = None
+        return self._endpoint_index
+
     def get_intersection_points(self, threshold=50):
         """
         Returns a list of points in scene coordinates that represent the average location of
         each intersection of two or more fixture endpoints.
 
-        For each fixture endpoint, all other endpoints are compared to see if they fall within a certain distance
-        of the given endpoint.  This loop generates a list of groups.  Then, the average location of each
+        For each fixture endpoint, all other endpoints within a certain distance of the given endpoint are found
+        with a KD-tree query.  This loop generates a list of groups.  Then, the average location of each
         group is calculated and returned.
         """
-        if self._intersection_points is None:
+        endpoints, tree = self._get_endpoint_index()
 
-            endpoints = []
-            for f in self.fixtures():
-                endpoints.append(f.pos1)
-                endpoints.append(f.pos2)
-
-            groups = []
-            while len(endpoints) > 0:
-                endpoint = endpoints.pop()
-                group = [endpoint]
-                to_remove = []
-                for other in endpoints:
-                    dx, dy = (other[0] - endpoint[0], other[1] - endpoint[1])
-                    dist = math.fabs(math.sqrt(math.pow(dx, 2) + math.pow(dy, 2)))
-                    if (dist < threshold):
-                        group.append(other)
-                        to_remove.append(other)
-                endpoints = [e for e in endpoints if e not in to_remove]
-                groups.append(group)
+        if self._intersection_points is None:
 
+            # Endpoints are taken from the end of the list, and each one
+            # claims every unclaimed endpoint strictly within the threshold.
+            radius = np.nextafter(threshold, 0)
+            unclaimed = np.ones(len(endpoints), dtype=bool)
             centroids = []
-            for group in groups:
-                num_points = len(group)
-                tx = 0
-                ty = 0
-                for point in group:
-                    tx += point[0]
-                    ty += point[1]
-                centroids.append((old_div(tx, num_points), old_div(ty, num_points)))
+            for i in range(len(endpoints) - 1, -1, -1):
+                if not unclaimed[i]:
+                    continue
+                group = np.asarray(tree.query_ball_point(endpoints[i], radius),
+                                   dtype=np.intp)
+                group = group[unclaimed[group]]
+                unclaimed[group] = False
+                cx, cy = endpoints[group].mean(axis=0).tolist()
+                centroids.append((cx, cy))
             self._intersection_points = centroids
 
         return self._intersection_points
@@ -526,6 +771,8 @@ class Scene(JSONDict):
         for pg_data in self["pixel-groups"]:
             if pg_data["type"] == "linear":
                 pg = LinearPixelGroup(json=pg_data)
+                pg.geometry_changed.connect(self._on_pixel_group_geometry_changed)
+                pg.address_changed.connect(self._on_pixel_group_address_changed)
                 self._pixel_groups.append(pg)
             else:
                 raise NotImplementedError("Unsupported pixel group type!")
@@ -0,0 +1,35 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Tests run from the repository root or from test/; either way the
+# repository's packages must be importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENES = os.path.join(ROOT, "data", "scenes")
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PyQt5.QtCore import QCoreApplication
+    app = QCoreApplication.instance()
+    if app is None:
+        app = QCoreApplication(["firesim-test"])
+    return app
+
+
+@pytest.fixture
+def scene_file(tmp_path):
+    """
+    Returns a function giving the path of a copy of a bundled scene.  Loading
+    a scene can upgrade and re-save the file, so tests never load the
+    originals.
+    """
+    def copy(name):
+        path = str(tmp_path / name)
+        shutil.copy(os.path.join(SCENES, name), path)
+        return path
+    return copy
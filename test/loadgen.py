@@ -0,0 +1,326 @@
+"""
+Load generator for FireSim.
+
+Streams frames to FireSim using either the legacy B/S/E protocol or the
+versioned protocol in lib.protocol, at a target frame rate, with optional
+packet loss, reordering and bursts.  Used to find FireSim's ingest ceiling.
+
+Usage (from the repository root):
+
+    python test/loadgen.py [--scene FILE | --strands N --pixels N]
+                           [--fps N] [--protocol legacy|v1]
+                           [--packet-size N] [--loss P] [--reorder P]
+                           [--burst N] [--sender socket|qt]
+                           [--host HOST] [--port N] [--duration SECONDS]
+
+--fps 0 sends as fast as possible.  Frames are rainbows moving along each
+strand, as the old test server sent.
+"""
+from __future__ import print_function
+import argparse
+import colorsys
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+import numpy as np
+
+from PyQt5 import QtCore, QtNetwork
+
+# Run as a script from test/, so make the repository's packages importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.buffer_utils import BufferUtils
+from lib.protocol import DEFAULT_MAX_DATAGRAM, HEADER, RECORD, pack_frame
+from models.scene import Scene
+
+# Distinct frames generated up front and then cycled through
+NUM_FRAMES = 120
+
+
+def strand_lengths_from_args(args):
+    if args.scene is not None:
+        return np.diff(BufferUtils.strand_offsets(Scene(args.scene))).tolist()
+    return [args.pixels] * args.strands
+
+
+def rainbow_frames(strand_lengths, num_frames=NUM_FRAMES):
+    """
+    Returns a list of frames (dicts of strand number to RGB888 uint8 data)
+    """
+    hsv_to_rgb = np.vectorize(colorsys.hsv_to_rgb, otypes=[float] * 3)
+    frames = []
+    for i in range(num_frames):
+        frame = {}
+        for strand, length in enumerate(strand_lengths):
+            hue = np.fmod(i / float(num_frames) + 0.2 * strand +
+                          np.arange(length) / float(max(length, 1)), 1.0)
+            rgb = np.stack(hsv_to_rgb(hue, 1.0, 1.0), axis=1)
+            frame[strand] = (rgb * 255).astype(np.uint8).reshape(-1)
+        frames.append(frame)
+    return frames
+
+
+class FrameSource(object):
+    """
+    Pre-encodes a cycle of frames so that sending is only socket writes.
+
+    For the versioned protocol the frame ID is patched into each datagram as
+    it is sent, so every frame sent has a new ID.
+    """
+
+    def __init__(self, frames, protocol="v1",
+                 packet_size=DEFAULT_MAX_DATAGRAM):
+        self.protocol = protocol
+        self.frame_id = 0
+        if protocol == "legacy":
+            self.encoded = [self.encode_legacy(frame) for frame in frames]
+        else:
+            self.encoded = [[bytearray(d) for d in
+                             pack_frame(0, frame, packet_size)]
+                            for frame in frames]
+
+    @staticmethod
+    def encode_legacy(frame):
+        datagrams = [b'B']
+        for strand, data in sorted(frame.items()):
+            n = len(data)
+            datagrams.append(bytes([ord('S'), strand, n & 0xFF,
+                                    (n >> 8) & 0xFF]) + data.tobytes())
+        datagrams.append(b'E')
+        return datagrams
+
+    def next_frame(self):
+        """
+        Returns the datagrams for the next frame
+        """
+        datagrams = self.encoded[self.frame_id % len(self.encoded)]
+        if self.protocol != "legacy":
+            frame_id = (self.frame_id & 0xFFFFFFFF).to_bytes(4, "little")
+            for d in datagrams:
+                d[4:8] = frame_id
+        self.frame_id += 1
+        return datagrams
+
+
+class Impairments(object):
+    """
+    Drops each datagram with probability `loss`, and swaps each datagram with
+    the one after it with probability `reorder`
+    """
+
+    def __init__(self, loss=0.0, reorder=0.0, seed=None):
+        self.loss = loss
+        self.reorder = reorder
+        self.random = random.Random(seed)
+        self.dropped = 0
+        self.reordered = 0
+
+    def apply(self, datagrams):
+        if self.loss <= 0 and self.reorder <= 0:
+            return datagrams
+        out = []
+        for d in datagrams:
+            if self.loss > 0 and self.random.random() < self.loss:
+                self.dropped += 1
+                continue
+            out.append(d)
+        if self.reorder > 0:
+            for i in range(len(out) - 1):
+                if self.random.random() < self.reorder:
+                    out[i], out[i + 1] = out[i + 1], out[i]
+                    self.reordered += 1
+        return out
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.frames = 0
+        self.datagrams = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+        self._last_frames = 0
+
+    def sent(self, datagrams):
+        self.frames += 1
+        self.datagrams += len(datagrams)
+        self.bytes += sum(len(d) for d in datagrams)
+
+    def report(self, impairments, force=False):
+        now = time.perf_counter()
+        if not force and now - self._last_report < 1.0:
+            return
+        if force:
+            # The final report gives the average over the whole run
+            fps = self.frames / max(now - self.start, 1e-9)
+        else:
+            fps = (self.frames - self._last_frames) / (now - self._last_report)
+        print("%8.1f fps  %8d frames  %10d datagrams  %8.1f MB  "
+              "(%d dropped, %d reordered)" %
+              (fps, self.frames, self.datagrams, self.bytes / 1e6,
+               impairments.dropped, impairments.reordered))
+        sys.stdout.flush()
+        self._last_report = now
+        self._last_frames = self.frames
+
+
+class Schedule(object):
+    """
+    Works out how many frames are due, against time.perf_counter().  Frames
+    are sent in bursts of `burst` frames, with the gaps between bursts
+    keeping the average at `fps`.
+    """
+
+    def __init__(self, fps, burst=1):
+        self.interval = (burst / float(fps)) if fps > 0 else 0
+        self.burst = burst
+        self.next_time = time.perf_counter()
+
+    def due(self):
+        """
+        Returns the number of frames to send now
+        """
+        if self.interval == 0:
+            return self.burst
+        now = time.perf_counter()
+        if now < self.next_time:
+            return 0
+        self.next_time += self.interval
+        # Don't try to catch up after a long stall
+        if now - self.next_time > 1.0:
+            self.next_time = now
+        return self.burst
+
+    def wait(self):
+        remaining = self.next_time - time.perf_counter()
+        if remaining > 0.002:
+            time.sleep(remaining - 0.001)
+
+
+def run_socket_sender(args, source, impairments, stats):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = (args.host, args.port)
+    schedule = Schedule(args.fps, args.burst)
+    end = None if args.duration is None else time.perf_counter() + args.duration
+    try:
+        while end is None or time.perf_counter() < end:
+            for _ in range(schedule.due()):
+                datagrams = impairments.apply(source.next_frame())
+                for d in datagrams:
+                    try:
+                        sock.sendto(d, address)
+                    except OSError:
+                        # e.g. ENOBUFS when sending faster than the kernel
+                        # can drain; count it as loss
+                        impairments.dropped += 1
+                stats.sent(datagrams)
+            stats.report(impairments)
+            schedule.wait()
+    except KeyboardInterrupt:
+        pass
+    stats.report(impairments, True)
+
+
+class QtLoadGenerator(QtCore.QObject):
+    """
+    Sends frames from a QUdpSocket in a Qt event loop
+    """
+
+    def __init__(self, args, source, impairments, stats):
+        super(QtLoadGenerator, self).__init__()
+        self.args = args
+        self.source = source
+        self.impairments = impairments
+        self.stats = stats
+        self.schedule = Schedule(args.fps, args.burst)
+        self.address = QtNetwork.QHostAddress(args.host)
+        self.socket = QtNetwork.QUdpSocket(self)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self.timer.timeout.connect(self.send_due_frames)
+        self.timer.start(0 if args.fps <= 0 else 1)
+
+    @QtCore.pyqtSlot()
+    def send_due_frames(self):
+        for _ in range(self.schedule.due()):
+            datagrams = self.impairments.apply(self.source.next_frame())
+            for d in datagrams:
+                self.socket.writeDatagram(bytes(d), self.address,
+                                          self.args.port)
+            self.stats.sent(datagrams)
+        self.stats.report(self.impairments)
+
+
+def sigint_handler(signal, frame):
+    global app
+    app.exit()
+
+
+def main():
+    global app
+
+    parser = argparse.ArgumentParser(description="FireSim load generator")
+    parser.add_argument("--scene", type=str, default=None,
+                        help="Take strand lengths from this scene file")
+    parser.add_argument("--strands", type=int, default=40)
+    parser.add_argument("--pixels", type=int, default=160,
+                        help="Pixels per strand")
+    parser.add_argument("--fps", type=float, default=60,
+                        help="Target frame rate (0 for as fast as possible)")
+    parser.add_argument("--protocol", choices=("legacy", "v1"), default="v1")
+    parser.add_argument("--packet-size", type=int, default=DEFAULT_MAX_DATAGRAM,
+                        help="Maximum datagram size (v1 protocol only)")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="Probability of dropping each datagram")
+    parser.add_argument("--reorder", type=float, default=0.0,
+                        help="Probability of swapping each datagram with the next")
+    parser.add_argument("--burst", type=int, default=1,
+                        help="Send frames in bursts of this many")
+    parser.add_argument("--sender", choices=("socket", "qt"), default="socket")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3020)
+    parser.add_argument("--duration", type=float, default=None,
+                        help="Stop after this many seconds")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    # A datagram must have room for a header, a record and one pixel
+    min_packet_size = HEADER.size + RECORD.size + 3
+    if args.protocol == "v1" and args.packet_size < min_packet_size:
+        parser.error("--packet-size must be at least %d" % min_packet_size)
+
+    strand_lengths = strand_lengths_from_args(args)
+    print("Sending %d strands (%d pixels) with the %s protocol to %s:%d" %
+          (len(strand_lengths), sum(strand_lengths), args.protocol,
+           args.host, args.port))
+    source = FrameSource(rainbow_frames(strand_lengths), args.protocol,
+                         args.packet_size)
+    impairments = Impairments(args.loss, args.reorder, args.seed)
+    stats = Stats()
+
+    if args.sender == "socket":
+        run_socket_sender(args, source, impairments, stats)
+        return
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    app = QtCore.QCoreApplication(["loadgen"])
+    print("Press Ctrl-C to quit")
+    generator = QtLoadGenerator(args, source, impairments, stats)
+    if args.duration is not None:
+        QtCore.QTimer.singleShot(int(args.duration * 1000), app.quit)
+    # Lets Python handle Ctrl-C while the event loop is running
+    idle = QtCore.QTimer()
+    idle.timeout.connect(lambda: None)
+    idle.start(250)
+    app.exec_()
+    stats.report(impairments, True)
+
+
+if __name__ == "__main__":
+    main()
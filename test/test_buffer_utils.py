@@ -0,0 +1,71 @@
+import numpy as np
+
+from lib.buffer_utils import BufferUtils
+from models.scene import Scene
+
+
+def test_tables_follow_the_scene_they_are_used_with(scene_file):
+    lotus = Scene(scene_file("lotus.json"))
+    demo = Scene(scene_file("demo.json"))
+
+    # Warming up either scene leaves the global tables built for it
+    lotus.warmup()
+    demo.warmup()
+
+    for scene in (lotus, demo, lotus):
+        fh = scene.fixture_hierarchy()
+        logical = np.array(scene.get_all_pixels_logical(), dtype=np.int32)
+        indices = BufferUtils.logical_to_index_array(logical, scene=scene)
+        assert len(indices) == sum(pg.count for pg in scene.pixel_groups)
+        for address, index in zip(logical[::97], indices[::97]):
+            assert BufferUtils.index_to_logical(int(index), scene=scene) == \
+                tuple(address.tolist())
+            strand, fixture, offset = address
+            assert fh[strand][fixture].count > offset
+
+
+def test_tables_are_rebuilt_when_addressing_changes(scene_file):
+    scene = Scene(scene_file("lotus.json"))
+    BufferUtils.init(scene)
+    size = BufferUtils.get_buffer_size()
+
+    pg = max(scene.pixel_groups, key=lambda pg: (pg.strand, pg.offset))
+    pg.count += 10
+    index = BufferUtils.logical_to_index(
+        scene.fixture_address(pg) + (pg.count - 1,), scene=scene)
+    assert BufferUtils.get_buffer_size() >= size + 10
+    assert index < BufferUtils.get_buffer_size()
+
+
+def test_strand_offsets_leave_the_tables_alone(scene_file):
+    lotus = Scene(scene_file("lotus.json"))
+    demo = Scene(scene_file("demo.json"))
+    BufferUtils.init(demo)
+    expected = [0] + [BufferUtils.get_strand_extents(strand)[1]
+                      for strand in range(BufferUtils.num_strands)]
+
+    BufferUtils.init(lotus)
+    size = BufferUtils.get_buffer_size()
+    assert BufferUtils.strand_offsets(demo).tolist() == expected
+    assert BufferUtils.get_buffer_size() == size
+    assert BufferUtils._address_version == lotus.address_version
+
+
+def test_extents_follow_addressing_changes(scene_file):
+    scene = Scene(scene_file("lotus.json"))
+    BufferUtils.init(scene)
+    pg = max((pg for pg in scene.pixel_groups if pg.strand == 0),
+             key=lambda pg: pg.offset)
+    strand, fixture = scene.fixture_address(pg)
+    num_fixtures = BufferUtils.strand_num_fixtures(strand)
+    start, end = BufferUtils.get_fixture_extents(strand, fixture)
+
+    pg.count += 5
+    assert BufferUtils.fixture_length(strand, fixture, scene=scene) == \
+        pg.count
+    assert BufferUtils.get_fixture_extents(strand, fixture, scene=scene) == \
+        (start, end + 5)
+    assert BufferUtils.get_strand_length(strand, scene=scene) >= \
+        pg.offset + pg.count
+    assert BufferUtils.strand_num_fixtures(strand, scene=scene) == \
+        num_fixtures
@@ -0,0 +1,41 @@
+import numpy as np
+
+from models.canvas import Canvas
+from models.scene import Scene
+
+
+def make_canvas(path):
+    canvas = Canvas()
+    canvas.scene = Scene(path)
+    canvas.update_color_buffer()
+    return canvas
+
+
+def test_strand_colors_accept_arrays_bytes_and_lists(scene_file):
+    canvas = make_canvas(scene_file("lotus.json"))
+    expected = np.arange(30, dtype=np.uint8).reshape(-1, 3)
+    for data in (expected.reshape(-1), expected.tobytes(),
+                 bytearray(expected.tobytes()), expected.reshape(-1).tolist()):
+        canvas.color_buffer[:] = 0
+        canvas.set_strand_colors(0, data)
+        assert np.array_equal(canvas.strand_colors(0)[:10], expected)
+        assert np.all(canvas.color_buffer[:10, 3] == 255)
+        assert np.all(canvas.color_buffer[10:len(canvas.strand_colors(0)), 3]
+                      == 0)
+
+
+def test_relayout_clears_colors(scene_file):
+    canvas = make_canvas(scene_file("lotus.json"))
+    scene = canvas.scene
+    canvas.set_frame(dict((strand, np.full(3 * len(canvas.strand_colors(strand)),
+                                           200, dtype=np.uint8))
+                          for strand in range(len(canvas._strand_offsets) - 1)))
+    size = len(canvas.color_buffer)
+
+    # Swap two groups of the same length: the buffer keeps its size
+    a, b = [pg for pg in scene.pixel_groups
+            if pg.strand == 0 and pg.count == 9][:2]
+    a.offset, b.offset = b.offset, a.offset
+    canvas.update_color_buffer()
+    assert len(canvas.color_buffer) == size
+    assert not canvas.color_buffer.any()
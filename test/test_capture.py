@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from lib.buffer_utils import BufferUtils
+from lib.capture import CaptureReader, CaptureWriter, scene_hash
+from models.scene import Scene
+
+
+def strand_data(offsets, strand, value):
+    return np.full(3 * (offsets[strand + 1] - offsets[strand]), value,
+                   dtype=np.uint8)
+
+
+def test_write_and_read_back(scene_file, tmp_path):
+    scene = Scene(scene_file("lotus.json"))
+    offsets = BufferUtils.strand_offsets(scene)
+    path = str(tmp_path / "test.fscap")
+
+    writer = CaptureWriter.for_scene(path, scene)
+    for i in range(5):
+        # Strand 1 is missing from the odd frames
+        frame = dict((strand, strand_data(offsets, strand, 10 * i + strand))
+                     for strand in range(len(offsets) - 1)
+                     if strand != 1 or i % 2 == 0)
+        writer.write_frame(frame, timestamp=100.0 + 0.5 * i)
+    writer.close()
+    assert writer.frames_written == 5
+    assert writer.dropped == 0
+
+    capture = CaptureReader(path)
+    assert len(capture) == 5
+    assert capture.pixel_count == offsets[-1]
+    assert capture.matches(scene)
+    assert capture.timestamps.tolist() == [0.0, 0.5, 1.0, 1.5, 2.0]
+    for i in range(5):
+        rgb = capture.frame(i)
+        for strand in range(len(offsets) - 1):
+            colors = rgb[offsets[strand]:offsets[strand + 1]]
+            expected = 0 if strand == 1 and i % 2 else 10 * i + strand
+            assert np.all(colors == expected)
+
+
+def test_layout_changes_are_detected(scene_file):
+    scene = Scene(scene_file("lotus.json"))
+    digest = scene_hash(scene)
+    scene.pixel_groups[0].start = (0, 0)
+    assert scene_hash(scene) == digest
+    scene.pixel_groups[0].count += 1
+    assert scene_hash(scene) != digest
+
+
+def test_truncated_capture(tmp_path):
+    path = str(tmp_path / "test.fscap")
+    writer = CaptureWriter(path, [0, 4], b'\0' * 32)
+    for i in range(3):
+        writer.write_frame({0: np.full(12, i, np.uint8)}, timestamp=i)
+    writer.close()
+
+    # A frame cut short by a crash is left out
+    with open(path, "r+b") as f:
+        f.seek(-3, 2)
+        f.truncate()
+    capture = CaptureReader(path)
+    assert len(capture) == 2
+    assert capture.frame(1).tolist() == [[1, 1, 1]] * 4
+
+
+def test_not_a_capture(tmp_path):
+    path = str(tmp_path / "test.fscap")
+    with open(path, "wb") as f:
+        f.write(b'\0' * 64)
+    with pytest.raises(ValueError):
+        CaptureReader(path)
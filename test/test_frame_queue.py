@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from lib.frame_queue import Frame, FrameQueue
+
+
+def publish(queue, n, start=0):
+    """
+    Fills and publishes n frames, marking each with its number
+    """
+    for i in range(start, start + n):
+        frame = queue.acquire()
+        frame.timestamp = i
+        queue.publish(frame)
+
+
+def take_all(queue):
+    taken = []
+    while True:
+        frame = queue.take()
+        if frame is None:
+            return taken
+        taken.append(frame.timestamp)
+        queue.release(frame)
+
+
+def test_drop_oldest_keeps_the_newest_frames():
+    queue = FrameQueue(depth=2, policy="drop-oldest")
+    publish(queue, 3)
+    assert take_all(queue) == [1, 2]
+    assert queue.dropped == 1
+
+
+def test_latest_keeps_only_the_newest_frame():
+    queue = FrameQueue(depth=5, policy="latest")
+    assert queue.depth == 1
+    publish(queue, 3)
+    assert take_all(queue) == [2]
+    assert queue.dropped == 2
+
+
+def test_producer_reclaims_frames_instead_of_growing_the_pool():
+    queue = FrameQueue(depth=2)
+    pool_size = len(queue._free)
+    publish(queue, 10)
+
+    # Every frame ever used came from the original pool
+    assert len(queue) + len(queue._free) == pool_size
+    assert take_all(queue) == [8, 9]
+    assert queue.dropped == 8
+
+    queue.reset_counters()
+    assert queue.dropped == 0
+
+
+def test_taken_frames_stay_out_of_the_pool_until_released():
+    queue = FrameQueue(depth=1)
+    publish(queue, 1)
+    shown = queue.take()
+    publish(queue, 10, start=1)
+    assert shown.timestamp == 0
+    assert all(frame is not shown for frame in queue._free)
+    queue.release(shown)
+
+
+def test_bad_arguments():
+    with pytest.raises(ValueError):
+        FrameQueue(policy="drop-newest")
+    with pytest.raises(ValueError):
+        FrameQueue(depth=0)
+
+
+def test_strands_written_in_pieces():
+    frame = Frame()
+    frame.write_strand(0, 6, np.arange(3, dtype=np.uint8) + 1)
+    frame.write_strand(0, 0, np.arange(3, dtype=np.uint8) + 10)
+    assert frame.strands[0].tolist() == [10, 11, 12, 0, 0, 0, 1, 2, 3]
+
+    # Recycled storage is reused, and gaps are cleared
+    storage = frame._storage[0]
+    frame.clear()
+    frame.write_strand(0, 3, np.ones(3, dtype=np.uint8))
+    assert frame._storage[0] is storage
+    assert frame.strands[0].tolist() == [0, 0, 0, 1, 1, 1]
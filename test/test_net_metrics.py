@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from lib.net_metrics import Histogram, NetMetrics
+
+
+def test_histogram_buckets_and_percentiles():
+    h = Histogram(edges_ms=(1, 10, 100))
+    for ms in (0.5, 0.5, 5, 5, 5, 50, 50, 50, 50, 500):
+        h.record(ms / 1000.0)
+    assert h.counts.tolist() == [2, 3, 4, 1]
+    assert h.count == 10
+    assert h.mean() == pytest.approx(0.0716)
+    assert (h.min, h.max) == (0.0005, 0.5)
+
+    # Percentiles are reported as bucket edges, or the maximum past the last
+    assert h.percentile(20) == 0.001
+    assert h.percentile(50) == 0.01
+    assert h.percentile(90) == 0.1
+    assert h.percentile(100) == 0.5
+
+    # A value exactly on an edge falls in that edge's bucket
+    h.reset()
+    h.record(0.01)
+    assert h.counts.tolist() == [0, 1, 0, 0]
+
+
+def test_empty_histogram():
+    h = Histogram()
+    assert h.mean() == 0.0
+    assert h.percentile(90) == 0.0
+    snapshot = h.snapshot()
+    assert snapshot["count"] == 0
+    assert snapshot["min"] is None
+
+
+def test_frame_intervals_and_jitter():
+    m = NetMetrics()
+    for completed in (1.0, 1.010, 1.030, 1.040):
+        m.frame_completed(completed - 0.002, completed)
+    m.frame_painted(1.040, 1.045)
+
+    h = m.histograms
+    assert m.frames_completed == 4
+    assert h["assembly_latency"].count == 4
+    assert h["frame_interval"].count == 3
+    assert h["frame_interval"].max == pytest.approx(0.020)
+    assert h["jitter"].count == 2
+    assert h["jitter"].min == pytest.approx(0.010)
+    assert h["paint_latency"].mean() == pytest.approx(0.005)
+
+
+def test_snapshot_and_reset():
+    m = NetMetrics()
+    for strand in (0, 1, 1):
+        m.packet_received(100)
+        m.strand_received(strand)
+    m.malformed_packets += 1
+
+    snapshot = json.loads(m.to_json())
+    assert snapshot["packets"] == 3
+    assert snapshot["bytes"] == 300
+    assert snapshot["strand_packets"] == {"0": 1, "1": 2}
+    assert snapshot["malformed_packets"] == 1
+    assert "3 pkts (1 malformed" in m.summary()
+
+    m.frame_completed(1.0, 1.0)
+    m.reset()
+    assert m.packets == 0
+    assert m.strand_packets == {}
+    assert all(h.count == 0 for h in m.histograms.values())
+
+    # The first frame after a reset starts a new interval
+    m.frame_completed(5.0, 5.0)
+    assert m.histograms["frame_interval"].count == 0
+
+
+def test_reports_write_their_snapshot(tmp_path):
+    from lib.timing import Timings
+
+    m = NetMetrics()
+    m.packet_received(10)
+    timings = Timings()
+    timings.record("ingest", 0.002)
+    path = str(tmp_path / "report.json")
+    m.write_json(path)
+    with open(path) as f:
+        assert json.load(f)["bytes"] == 10
+    timings.write_json(path)
+    with open(path) as f:
+        assert json.load(f)["spans"]["ingest"]["count"] == 1
+
+    # Errors are logged, not raised
+    m.write_json(str(tmp_path / "missing" / "report.json"))
@@ -0,0 +1,106 @@
+import argparse
+
+import numpy as np
+
+from controllers.netcontroller import NetController
+from lib.protocol import pack_frame
+from models.scene import Scene
+
+
+def legacy_frame(value, num_strands=2, pixels=4):
+    packets = [b'B']
+    for strand in range(num_strands):
+        n = pixels * 3
+        packets.append(bytes([ord('S'), strand, n & 0xFF, n >> 8]) +
+                       bytes([value]) * n)
+    packets.append(b'E')
+    return packets
+
+
+def make_controller(**kwargs):
+    nc = NetController(None, transport=None, **kwargs)
+    shown = []
+    nc.new_frame.connect(
+        lambda frame: shown.append(dict((strand, data.copy())
+                                        for strand, data in frame.items())))
+    return nc, shown
+
+
+def test_frames_are_emitted_in_order(qapp):
+    nc, shown = make_controller()
+    for value in (1, 2):
+        for packet in legacy_frame(value):
+            nc.process_packet(packet)
+    assert [frame[0][0] for frame in shown] == [1, 2]
+    assert nc.get_metrics()["frames_completed"] == 2
+
+
+def test_coalescing_shows_only_the_newest_frame(qapp):
+    nc, shown = make_controller(coalesce=True)
+    for value in range(1, 6):
+        for packet in pack_frame(value, {0: np.full(12, value, np.uint8)}):
+            nc.process_packet(packet)
+    assert shown == []
+
+    nc.flush_frame()
+    assert len(shown) == 1
+    assert shown[0][0].tolist() == [5] * 12
+    assert nc.metrics.frames_skipped == 4
+
+    # Nothing new arrived, so there is nothing more to show
+    nc.flush_frame()
+    assert len(shown) == 1
+
+
+def test_coalescing_does_not_exhaust_the_pool(qapp):
+    nc, shown = make_controller(coalesce=True)
+    # Let frames pile up, as if the GUI thread were busy
+    nc.frame_ready.disconnect(nc.on_frame_ready)
+
+    def chunks(frame_id):
+        return pack_frame(frame_id, {0: np.full(300, frame_id, np.uint8)}, 200)
+
+    # One frame displayed, one held back for the next paint
+    for frame_id in (1, 2):
+        for packet in chunks(frame_id):
+            nc.process_packet(packet)
+        nc.on_frame_ready()
+        if frame_id == 1:
+            nc.flush_frame()
+
+    # A full ready queue while the assembler has the most partial frames
+    for frame_id in (10, 11, 12):
+        nc.process_packet(chunks(frame_id)[0])
+    for frame_id in (5, 6):
+        for packet in chunks(frame_id):
+            nc.process_packet(packet)
+    nc.process_packet(chunks(13)[0])
+    assert len(nc.frames) == 2
+    assert nc.frames.dropped == 0
+
+    nc.on_frame_ready()
+    nc.flush_frame()
+    assert shown[-1][0][0] == 6
+
+
+def test_from_config(qapp, scene_file, tmp_path):
+    config = {"net-transport": None, "net-queue-depth": 3,
+              "net-drop-policy": "latest", "net-metrics-interval": 5}
+    args = argparse.Namespace(stats_interval=None,
+                              record=str(tmp_path / "test.fscap"))
+    nc = NetController.from_config(None, config, args,
+                                   Scene(scene_file("lotus.json")))
+    try:
+        assert nc.frames.policy == "latest"
+        assert nc.coalesce
+        assert nc._metrics_timer.interval() == 5000
+        assert nc.recorder is not None
+    finally:
+        nc.stop()
+
+    args.record = None
+    args.stats_interval = 0
+    nc = NetController.from_config(None, config, args, None, coalesce=False)
+    assert not nc.coalesce
+    assert nc._metrics_timer is None
+    assert nc.recorder is None
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from lib.dtypes import pixel_location
+from models.pixelgroup import LinearPixelGroup
+
+
+def per_pixel_locations(start, end, count):
+    """
+    The per-pixel loop LinearPixelGroup._update_geometry() used to run
+    """
+    locations = np.zeros(count, dtype=pixel_location)
+    if count > 0:
+        ox = (end[0] - start[0]) / count
+        oy = (end[1] - start[1]) / count
+        px, py = start[0], start[1]
+        for i in range(count):
+            locations[i] = (px, py)
+            px += ox
+            py += oy
+    return locations
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 7, 160])
+@pytest.mark.parametrize("start, end", [((0, 0), (100, 0)),
+                                        ((35.5, 410), (-20, 12.25)),
+                                        ((50, 50), (50, 50))])
+def test_locations_match_the_per_pixel_loop(start, end, count):
+    pg = LinearPixelGroup(start=start, end=end, count=count)
+    expected = per_pixel_locations(start, end, count)
+    assert pg.pixel_locations.shape == (count,)
+    for field in pixel_location.names:
+        assert np.allclose(pg.pixel_locations[field], expected[field],
+                           atol=1e-3)
+
+    # Moving the group recomputes them
+    pg.start = (start[0] + 10, start[1])
+    pg._update_geometry()
+    expected = per_pixel_locations(pg.start, end, count)
+    for field in pixel_location.names:
+        assert np.allclose(pg.pixel_locations[field], expected[field],
+                           atol=1e-3)
@@ -0,0 +1,96 @@
+import time
+
+import numpy as np
+import pytest
+
+from controllers.playbackcontroller import PlaybackController
+from lib.capture import CaptureReader, CaptureWriter
+
+NUM_FRAMES = 5
+
+
+@pytest.fixture
+def capture(tmp_path):
+    """
+    A capture of NUM_FRAMES frames 10 ms apart, each filled with its number
+    """
+    path = str(tmp_path / "test.fscap")
+    writer = CaptureWriter(path, [0, 4], b'\0' * 32)
+    for i in range(NUM_FRAMES):
+        writer.write_frame({0: np.full(12, i, np.uint8)}, timestamp=0.01 * i)
+    writer.close()
+    return CaptureReader(path)
+
+
+@pytest.fixture
+def make_player(qapp, capture):
+    players = []
+
+    def make(**kwargs):
+        player = PlaybackController(capture, **kwargs)
+        player.shown = []
+        player.new_frame.connect(
+            lambda frame: player.shown.append(int(frame[0][0])))
+        players.append(player)
+        return player
+    yield make
+    for player in players:
+        player.stop()
+
+
+def run_until(qapp, condition, timeout=5.0):
+    end = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < end:
+        qapp.processEvents()
+        time.sleep(0.001)
+    qapp.processEvents()
+    return condition()
+
+
+def test_plays_every_frame_then_finishes(qapp, make_player):
+    player = make_player()
+    finished = []
+    player.finished.connect(lambda: finished.append(True))
+    player.play()
+    assert run_until(qapp, lambda: finished)
+    assert player.shown[-1] == NUM_FRAMES - 1
+    assert player.emitted + player.skipped == NUM_FRAMES
+    assert not player.playing
+
+    # Playing again starts from the beginning
+    player.play()
+    assert run_until(qapp, lambda: len(finished) == 2)
+    assert player.emitted + player.skipped == 2 * NUM_FRAMES
+
+
+def test_seek(qapp, make_player):
+    player = make_player()
+    player.seek(3)
+    assert player.position == 3
+    run_until(qapp, lambda: False, timeout=0.05)
+    assert player.shown == []
+
+    player.play()
+    assert run_until(qapp, lambda: not player.playing)
+    assert player.shown[0] == 3
+
+    player.seek(99)
+    assert player.position == NUM_FRAMES - 1
+    player.seek_time(0.025)
+    assert player.position == 2
+    player.seek_time(-1)
+    assert player.position == 0
+
+
+def test_loop(qapp, make_player):
+    player = make_player(loop=True, fps=200)
+    player.play()
+    assert run_until(qapp, lambda: len(player.shown) >= 3 * NUM_FRAMES)
+    player.pause()
+    assert player.playing is False
+
+    # Frames come round in order (apart from any skipped when the event loop
+    # fell behind), and the loop never shows the same frame twice running
+    shown = player.shown
+    assert sum(1 for a, b in zip(shown, shown[1:]) if b < a) >= 2
+    assert all(a != b for a, b in zip(shown, shown[1:]))
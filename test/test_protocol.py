@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from lib.frame_queue import FrameQueue
+from lib.protocol import (FRAME_ID_MASK, FrameAssembler, HEADER, ProtocolError,
+                          RECORD, frame_id_newer, pack_frame)
+
+
+def make_strands(num_strands=4, pixels=200, seed=0):
+    rng = np.random.RandomState(seed)
+    return dict((strand, rng.randint(0, 256, pixels * 3).astype(np.uint8))
+                for strand in range(num_strands))
+
+
+def assemble(assembler, datagrams):
+    """
+    Feeds datagrams to the assembler, returning every frame completed
+    """
+    frames = []
+    for datagram in datagrams:
+        frame = assembler.process(datagram)
+        if frame is not None:
+            frames.append(frame)
+    return frames
+
+
+def assert_same_strands(frame, strands):
+    assert sorted(frame.strands) == sorted(strands)
+    for strand, data in strands.items():
+        assert np.array_equal(frame.strands[strand], data)
+
+
+@pytest.mark.parametrize("max_datagram", [HEADER.size + RECORD.size + 3,
+                                          100, 1472, 65507])
+def test_round_trip(max_datagram):
+    strands = make_strands()
+    datagrams = pack_frame(7, strands, max_datagram)
+    assert all(len(d) <= max_datagram for d in datagrams)
+
+    frames = assemble(FrameAssembler(FrameQueue()), datagrams)
+    assert len(frames) == 1
+    assert_same_strands(frames[0], strands)
+
+
+def test_chunks_in_any_order():
+    strands = make_strands()
+    datagrams = pack_frame(1, strands, 500)
+    assert len(datagrams) > 2
+    assembler = FrameAssembler(FrameQueue())
+    frames = assemble(assembler, datagrams[::-1])
+    assert len(frames) == 1
+    assert_same_strands(frames[0], strands)
+    assert assembler.incomplete == 0
+
+
+def test_lost_chunk_drops_the_frame():
+    first, second = make_strands(seed=1), make_strands(seed=2)
+    assembler = FrameAssembler(FrameQueue())
+    lossy = pack_frame(1, first, 500)
+    del lossy[1]
+
+    frames = assemble(assembler, lossy + pack_frame(2, second, 500))
+    assert len(frames) == 1
+    assert_same_strands(frames[0], second)
+    assert assembler.completed == 1
+    assert assembler.incomplete == 1
+
+
+def test_late_and_duplicate_chunks_are_ignored():
+    assembler = FrameAssembler(FrameQueue())
+    old = pack_frame(1, make_strands(seed=1), 500)
+    new = pack_frame(2, make_strands(seed=2), 500)
+
+    # A repeated chunk of a pending frame is a duplicate; any chunk of a
+    # frame no newer than the last completed one is late
+    frames = assemble(assembler, old[:1] + new[:1] + new + old[1:] + new[:1])
+    assert len(frames) == 1
+    assert assembler.duplicates == 1
+    assert assembler.late == len(old)
+    assert assembler.incomplete == 1
+
+
+def test_frame_ids_wrap_around():
+    assert frame_id_newer(0, FRAME_ID_MASK)
+    assert not frame_id_newer(FRAME_ID_MASK, 0)
+
+    assembler = FrameAssembler(FrameQueue())
+    for frame_id in (FRAME_ID_MASK - 1, FRAME_ID_MASK, 0, 1):
+        strands = make_strands(seed=frame_id & 0xFF)
+        frames = assemble(assembler, pack_frame(frame_id, strands, 500))
+        assert len(frames) == 1
+        assert_same_strands(frames[0], strands)
+        assembler.pool.release(frames[0])
+    assert assembler.late == 0
+
+
+def test_sender_restart_resyncs():
+    assembler = FrameAssembler(FrameQueue())
+    assemble(assembler, pack_frame(100000, make_strands(), 500))
+    frames = assemble(assembler, pack_frame(0, make_strands(), 500))
+    assert len(frames) == 1
+    assert assembler.late == 0
+
+
+def test_malformed_datagrams():
+    datagram = pack_frame(1, make_strands(num_strands=1, pixels=10))[0]
+    assembler = FrameAssembler(FrameQueue())
+    for bad in (datagram[:HEADER.size - 1], b'X' + datagram[1:],
+                datagram[:-1]):
+        with pytest.raises(ProtocolError):
+            assembler.process(bad)
+    assert assembler.completed == 0
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from lib import raster
+from lib.raster import RawVideoWriter, Rasterizer
+
+
+def random_frame(num_points, seed=0):
+    rng = np.random.RandomState(seed)
+    positions = rng.uniform(-20, 420, size=(num_points, 2))
+    colors = rng.randint(1, 256, size=(num_points, 4)).astype(np.uint8)
+    colors[rng.rand(num_points) < 0.3, 3] = 0
+    return positions, colors
+
+
+def test_large_footprints_render_the_same(monkeypatch):
+    positions, colors = random_frame(500)
+    args = (positions, (400, 400), (160, 120))
+    small = Rasterizer(*args)
+    assert small._pixels is not None
+
+    monkeypatch.setattr(raster, "MAX_FOOTPRINT_ENTRIES", 100)
+    large = Rasterizer(*args)
+    assert large._pixels is None
+
+    for frame in (colors, colors[:, :3]):
+        assert np.array_equal(large.render(frame), small.render(frame))
+
+
+def test_later_points_are_drawn_on_top():
+    positions = np.array([[50, 50], [52, 52], [200, 200]], dtype=np.float32)
+    colors = np.array([[255, 0, 0, 255], [0, 255, 0, 255], [0, 0, 255, 0]],
+                      dtype=np.uint8)
+    image = Rasterizer(positions, (400, 400), (400, 400)).render(colors)
+    assert tuple(image[51, 51]) == (0, 255, 0)
+    assert tuple(image[46, 46]) == (255, 0, 0)
+    assert not image[200, 200].any()
+
+
+def test_raw_video_writer_needs_somewhere_to_write(tmp_path):
+    with pytest.raises(ValueError):
+        RawVideoWriter()
+
+    path = str(tmp_path / "out.rgb")
+    writer = RawVideoWriter(path)
+    writer.write(np.full((2, 3, 3), 7, dtype=np.uint8))
+    writer.close()
+    with open(path, "rb") as f:
+        assert f.read() == b'\x07' * 18
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+from controllers import renderscheduler
+from controllers.renderscheduler import (DOWN_SECONDS, LOAD_SETTLE, MIN_FPS,
+                                         RenderScheduler, UP_SECONDS)
+
+
+class View(object):
+
+    def __init__(self):
+        self.updates = 0
+
+    def update(self):
+        self.updates += 1
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(renderscheduler.time, "perf_counter", clock)
+    return clock
+
+
+@pytest.fixture
+def scheduler(qapp, clock):
+    return RenderScheduler(View(), max_fps=60, idle_fps=0)
+
+
+def paint_for(scheduler, clock, seconds, cost):
+    """
+    Reports a paint of `cost` seconds once a second, for `seconds` seconds
+    """
+    for _ in range(seconds):
+        clock.now += 1.0
+        scheduler.painted(cost)
+
+
+def test_sustained_load_lowers_the_target(scheduler, clock):
+    cost = 0.025
+    paint_for(scheduler, clock, DOWN_SECONDS - 1, cost)
+    assert scheduler.target_fps == 60
+
+    changes = []
+    scheduler.target_fps_changed.connect(changes.append)
+    paint_for(scheduler, clock, 1, cost)
+    assert scheduler.target_fps == pytest.approx(LOAD_SETTLE / cost)
+    assert changes == [scheduler.target_fps]
+
+    # The new target is inside the band, so it stays put
+    paint_for(scheduler, clock, 10, cost)
+    assert changes == [scheduler.target_fps]
+
+
+def test_a_short_spike_is_ignored(scheduler, clock):
+    paint_for(scheduler, clock, DOWN_SECONDS - 1, 0.05)
+    # A cheap paint pulls the running average back below the band
+    for _ in range(100):
+        scheduler.painted(0.001)
+    paint_for(scheduler, clock, 1, 0.001)
+    assert scheduler.target_fps == 60
+
+
+def test_the_target_never_drops_below_the_minimum(scheduler, clock):
+    paint_for(scheduler, clock, DOWN_SECONDS, 1.0)
+    assert scheduler.target_fps == MIN_FPS
+
+
+def test_the_target_recovers_when_painting_gets_cheaper(scheduler, clock):
+    paint_for(scheduler, clock, DOWN_SECONDS, 0.03)
+    lowered = scheduler.target_fps
+    assert lowered < 60
+
+    # Settle the running average on the new cost first
+    for _ in range(200):
+        scheduler.painted(0.002)
+    paint_for(scheduler, clock, UP_SECONDS - 1, 0.002)
+    assert scheduler.target_fps == lowered
+    paint_for(scheduler, clock, 1, 0.002)
+    assert scheduler.target_fps == 60
+
+
+def test_requests_are_merged(qapp):
+    view = View()
+    scheduler = RenderScheduler(view, max_fps=60, idle_fps=0)
+    for _ in range(10):
+        scheduler.request()
+
+    end = time.perf_counter() + 1.0
+    while scheduler.paints == 0 and time.perf_counter() < end:
+        qapp.processEvents()
+    for _ in range(10):
+        qapp.processEvents()
+    assert scheduler.requests == 10
+    assert scheduler.paints == 1
+    assert view.updates == 1
+
+    # Nothing is painted while stopped, and start() repaints
+    scheduler.stop()
+    scheduler.request()
+    qapp.processEvents()
+    assert scheduler.paints == 1
+    scheduler.start()
+    end = time.perf_counter() + 1.0
+    while scheduler.paints == 1 and time.perf_counter() < end:
+        qapp.processEvents()
+    assert scheduler.paints == 2
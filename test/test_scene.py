@@ -0,0 +1,95 @@
+import numpy as np
+
+from models.pixelgroup import LinearPixelGroup
+from models.scene import Scene
+
+
+def move_group(pg, dx, dy):
+    pg.start = (pg.start[0] + dx, pg.start[1] + dy)
+    pg.end = (pg.end[0] + dx, pg.end[1] + dy)
+    pg._update_geometry()
+
+
+def test_distance_rows_follow_edits(scene_file):
+    scene = Scene(scene_file("lotus.json"))
+    scene.warmup()
+    before = scene.get_pixel_distances(0).copy()
+
+    move_group(scene.pixel_groups[-1], 300, 0)
+    after = scene.get_pixel_distances(0)
+    locations = scene.get_all_pixel_locations()
+    expected = np.hypot(*(locations - locations[0]).T)
+    assert not np.array_equal(before, after)
+    assert np.allclose(after, expected, atol=1e-3)
+
+
+def test_location_caches_follow_added_groups(scene_file):
+    scene = Scene(scene_file("lotus.json"))
+    count = len(scene.get_all_pixel_locations())
+    scene.add_pixel_group(LinearPixelGroup(start=(0, 0), end=(100, 0),
+                                           count=10, strand=7, offset=0))
+    assert len(scene.get_all_pixels()) == count + 10
+    assert len(scene.get_all_pixel_locations()) == count + 10
+
+
+def test_neighbor_graph_follows_edits(scene_file):
+    scene = Scene(scene_file("lotus.json"))
+    scene.warmup()
+
+    # Move a group far away from everything else; its pixels are then only
+    # neighbors of each other
+    move_group(scene.pixel_groups[-1], 5000, 5000)
+    locations = scene.get_all_pixel_locations()
+    moved = np.flatnonzero(locations[:, 0] > 4000)
+    assert len(moved) == scene.pixel_groups[-1].count
+
+    for pixel in moved:
+        neighbors = scene.get_pixel_neighbors(pixel)
+        assert set(neighbors) <= set(moved)
+        assert np.allclose(scene.get_pixel_neighbor_distances(pixel),
+                           np.hypot(*(locations[neighbors] -
+                                      locations[pixel]).T), atol=1e-3)
+    assert np.allclose(scene._tree.data, locations)
+
+
+def pairwise_intersection_points(scene, threshold):
+    """
+    The O(N^2) endpoint clustering that get_intersection_points() replaced
+    """
+    endpoints = []
+    for f in scene.fixtures():
+        endpoints.append(tuple(f.start))
+        endpoints.append(tuple(f.end))
+
+    centroids = []
+    while len(endpoints) > 0:
+        endpoint = endpoints.pop()
+        group = [endpoint]
+        for other in endpoints:
+            if np.hypot(other[0] - endpoint[0],
+                        other[1] - endpoint[1]) < threshold:
+                group.append(other)
+        endpoints = [e for e in endpoints if e not in group]
+        centroids.append(tuple(np.mean(group, axis=0)))
+    return centroids
+
+
+def test_intersection_points_match_pairwise_clustering(scene_file):
+    scene = Scene(scene_file("lotus.json"))
+    for threshold in (10, 50, 120):
+        scene._intersection_points = None
+        assert np.allclose(scene.get_intersection_points(threshold),
+                           pairwise_intersection_points(scene, threshold))
+
+    # Endpoints exactly `threshold` apart are not joined; closer ones are
+    for start, end in (((5000, 5000), (5000, 5400)),
+                       ((5050, 5000), (5450, 5000)),
+                       ((5000, 5449.5), (5000, 5800))):
+        scene.add_pixel_group(LinearPixelGroup(start=start, end=end,
+                                               count=10, strand=9, offset=0))
+    points = scene.get_intersection_points(50)
+    assert np.allclose(points, pairwise_intersection_points(scene, 50))
+    assert (5000, 5000) in points
+    assert (5050, 5000) in points
+    assert np.allclose([p for p in points if p[1] > 5420 and p[1] < 5430],
+                       [(5000, 5424.75)])
@@ -0,0 +1,69 @@
+import random
+
+from lib.geometry import hit_test_rect
+from lib.spatial_index import GridIndex
+
+
+def brute_force(rects, pos):
+    return [item for item, rect in rects if hit_test_rect(rect, pos)]
+
+
+def test_matches_brute_force():
+    rng = random.Random(0)
+    index = GridIndex(cell_size=50)
+    rects = []
+    for item in range(200):
+        rect = (rng.uniform(-100, 900), rng.uniform(-100, 900),
+                rng.uniform(0, 200), rng.uniform(0, 200))
+        rects.append((item, rect))
+        index.insert(item, rect)
+    assert len(index) == 200
+
+    for _ in range(1000):
+        pos = (rng.uniform(-150, 1150), rng.uniform(-150, 1150))
+        assert index.query_point(pos) == brute_force(rects, pos)
+
+
+def test_edges_and_cell_boundaries():
+    index = GridIndex(cell_size=50)
+    index.insert("a", (0, 0, 50, 50))
+    index.insert("b", (50, 50, 10, 10))
+    assert index.query_point((50, 50)) == ["a", "b"]
+    assert index.query_point((0, 0)) == ["a"]
+    assert index.query_point((60, 60)) == ["b"]
+    assert index.query_point((60.5, 60)) == []
+    assert index.query_point((-0.5, 10)) == []
+
+
+def test_results_keep_insertion_order():
+    index = GridIndex(cell_size=10)
+    for item in "cab":
+        index.insert(item, (0, 0, 100, 100))
+    assert index.query_point((55, 55)) == ["c", "a", "b"]
+
+    # Moving an item keeps its place; removing and re-adding it doesn't
+    index.update("c", (5, 5, 100, 100))
+    assert index.query_point((55, 55)) == ["c", "a", "b"]
+    index.remove("c")
+    index.insert("c", (0, 0, 100, 100))
+    assert index.query_point((55, 55)) == ["a", "b", "c"]
+
+
+def test_update_and_remove():
+    index = GridIndex(cell_size=50)
+    index.insert("a", (0, 0, 20, 20))
+
+    # Within the same cells, then into other cells
+    index.update("a", (10, 10, 20, 20))
+    assert index.query_point((25, 25)) == ["a"]
+    assert index.query_point((5, 5)) == []
+    index.update("a", (300, 300, 20, 20))
+    assert index.query_point((25, 25)) == []
+    assert index.query_point((310, 310)) == ["a"]
+    assert (0, 0) not in index._cells
+
+    index.remove("a")
+    assert "a" not in index
+    assert len(index) == 0
+    assert index._cells == {}
+    assert index.query_point((310, 310)) == []
@@ -0,0 +1,86 @@
+import time
+
+import numpy as np
+import pytest
+
+zmq = pytest.importorskip("zmq")
+
+from controllers import netcontroller
+from controllers.netcontroller import NetController
+from lib.protocol import pack_frame
+
+
+def wait_for(qapp, condition, timeout=5.0):
+    end = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < end:
+        qapp.processEvents()
+        time.sleep(0.005)
+    return condition()
+
+
+@pytest.fixture
+def publisher():
+    context = zmq.Context()
+    socket = context.socket(zmq.PUB)
+    socket.setsockopt(zmq.LINGER, 0)
+    port = socket.bind_to_random_port("tcp://127.0.0.1")
+    yield socket, "tcp://127.0.0.1:%d" % port
+    socket.close()
+    context.term()
+
+
+def test_frames_arrive_over_zmq(qapp, publisher):
+    socket, endpoint = publisher
+    nc = NetController(None, transport="zmq", zmq_endpoint=endpoint)
+    shown = []
+    nc.new_frame.connect(lambda frame: shown.append(frame[1].copy()))
+    try:
+        # A subscriber misses messages sent before it has connected, so keep
+        # sending until one gets through
+        frame_id = 0
+        end = time.perf_counter() + 5.0
+        while not shown and time.perf_counter() < end:
+            frame_id += 1
+            for datagram in pack_frame(frame_id,
+                                       {1: np.full(30, 42, np.uint8)}):
+                socket.send(datagram)
+            wait_for(qapp, lambda: shown, timeout=0.05)
+        assert shown and shown[0].tolist() == [42] * 30
+        assert nc.get_metrics()["frames_completed"] >= 1
+    finally:
+        nc.stop()
+
+
+class RecordingSocket(zmq.Socket):
+    options = {}
+
+    def setsockopt(self, option, value):
+        RecordingSocket.options[option] = value
+        super(RecordingSocket, self).setsockopt(option, value)
+
+
+class RecordingContext(zmq.Context):
+    _socket_class = RecordingSocket
+
+
+def test_socket_options(qapp, publisher, monkeypatch):
+    monkeypatch.setattr(netcontroller.zmq, "Context", RecordingContext)
+    _, endpoint = publisher
+
+    RecordingSocket.options = {}
+    nc = NetController(None, transport="zmq", zmq_endpoint=endpoint,
+                       zmq_hwm=7, zmq_conflate=True)
+    nc.stop()
+    assert RecordingSocket.options[zmq.RCVHWM] == 7
+    assert RecordingSocket.options[zmq.CONFLATE] == 1
+
+    RecordingSocket.options = {}
+    nc = NetController(None, transport="zmq", zmq_endpoint=endpoint)
+    nc.stop()
+    assert RecordingSocket.options[zmq.RCVHWM] == 1000
+    assert zmq.CONFLATE not in RecordingSocket.options
+
+
+def test_unknown_transport(qapp):
+    with pytest.raises(ValueError):
+        NetController(None, transport="carrier-pigeon")
@@ -0,0 +1,113 @@
+import numpy as np
+
+from PyQt5.QtGui import QOpenGLBuffer, QOpenGLShader, QOpenGLShaderProgram
+
+
+class CanvasRenderer(object):
+    """
+    Draws the scene's pixels as GL points.
+
+    Pixel positions live in a static vertex buffer that is only re-uploaded
+    when the geometry changes.  Colors are RGBA8 and uploaded as a single
+    array per frame; pixels with zero alpha (no data received) are not drawn.
+    """
+
+    VERTEX_SHADER = '''
+#version 120
+attribute highp vec2 posAttr;
+attribute lowp vec4 colAttr;
+uniform highp mat4 matrix;
+varying lowp vec4 col;
+
+void main() {
+    col = colAttr;
+    gl_Position = matrix * vec4(posAttr, 0.0, 1.0);
+}
+'''
+
+    FRAGMENT_SHADER = '''
+#version 120
+varying lowp vec4 col;
+
+void main (void)
+{
+    if (col.a == 0.0)
+        discard;
+    gl_FragColor = col;
+}
+'''
+
+    def __init__(self, gl, parent=None):
+        self.gl = gl
+
+        self.program = QOpenGLShaderProgram(parent)
+        self.program.addShaderFromSourceCode(QOpenGLShader.Vertex,
+                                             self.VERTEX_SHADER)
+        self.program.addShaderFromSourceCode(QOpenGLShader.Fragment,
+                                             self.FRAGMENT_SHADER)
+        self.program.link()
+
+        self.pos_attr = self.program.attributeLocation('posAttr')
+        self.col_attr = self.program.attributeLocation('colAttr')
+        self.matrix_uniform = self.program.uniformLocation('matrix')
+
+        self.pos_buf = QOpenGLBuffer()
+        self.pos_buf.create()
+        self.pos_buf.setUsagePattern(QOpenGLBuffer.StaticDraw)
+
+        self.col_buf = QOpenGLBuffer()
+        self.col_buf.create()
+        self.col_buf.setUsagePattern(QOpenGLBuffer.StreamDraw)
+
+        self.num_points = 0
+        self._col_nbytes = 0
+
+    def set_positions(self, positions):
+        """
+        Uploads an (N, 2) array of canvas-space pixel positions
+        """
+        positions = np.ascontiguousarray(positions, dtype=np.float32)
+        self.pos_buf.bind()
+        self.pos_buf.allocate(positions, positions.nbytes)
+        self.pos_buf.release()
+        self.num_points = len(positions)
+
+    def set_colors(self, colors):
+        """
+        Uploads an (N, 4) uint8 RGBA array, in the same order as the positions
+        """
+        self.col_buf.bind()
+        if colors.nbytes != self._col_nbytes:
+            self.col_buf.allocate(colors, colors.nbytes)
+            self._col_nbytes = colors.nbytes
+        else:
+            self.col_buf.write(0, colors, colors.nbytes)
+        self.col_buf.release()
+
+    def draw(self, matrix, point_size):
+        """
+        Draws all points, transforming positions by the QMatrix4x4 `matrix`
+        """
+        if self.num_points == 0 or self._col_nbytes == 0:
+            return
+
+        gl = self.gl
+
+        self.program.bind()
+        self.program.setUniformValue(self.matrix_uniform, matrix)
+
+        self.pos_buf.bind()
+        self.program.enableAttributeArray(self.pos_attr)
+        self.program.setAttributeBuffer(self.pos_attr, gl.GL_FLOAT, 0, 2)
+
+        self.col_buf.bind()
+        self.program.enableAttributeArray(self.col_attr)
+        self.program.setAttributeBuffer(self.col_attr, gl.GL_UNSIGNED_BYTE, 0, 4)
+        self.col_buf.release()
+
+        gl.glPointSize(point_size)
+        gl.glDrawArrays(gl.GL_POINTS, 0, self.num_points)
+
+        self.program.disableAttributeArray(self.pos_attr)
+        self.program.disableAttributeArray(self.col_attr)
+        self.program.release()
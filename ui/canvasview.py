@@ -13,7 +13,9 @@ from PyQt5.QtQuick import QQuickPaintedItem
 from PyQt5.QtQml import QQmlListProperty
 
 from controllers.canvascontroller import CanvasController
+from lib.timing import timings
 from models.pixelgroup import *
+from ui.canvasrenderer import CanvasRenderer
 
 
 log = logging.getLogger("firesim.ui.canvasview")
@@ -27,8 +29,6 @@ class CanvasView(QQuickPaintedItem):
 
     ENABLE_OPENGL = True
 
-    update_target_fps = pyqtSignal(float)
-
     def __init__(self, parent):
         super(CanvasView, self).__init__()
         self.parent = parent
@@ -41,19 +41,46 @@ class CanvasView(QQuickPaintedItem):
         self.setAcceptHoverEvents(True)
         self.forceActiveFocus()
 
-        #self.renderer = CanvasRenderer()
-
         self.gl = None
+        self.renderer = None
+
+        self._positions_key = None
+        self._pixel_positions = None
+        self._uploaded_positions = None
+        self._pixel_colors = np.zeros((0, 4), dtype=np.uint8)
 
         self._frame_time = time.perf_counter()
         self._frame_count = 0
         self._fps = 0
-        self._fps_below_target = 0
+        self._timing_lines = []
+        self._timing_font = QFont("monospace")
+        self._timing_font.setStyleHint(QFont.TypeWriter)
+        self._timing_font.setPointSize(7)
 
         self._cached_backdrop = None
         self._cached_backdrop_path = None
 
+        # Design-mode chrome of the pixel groups that aren't selected or
+        # hovered, drawn once into an image; see _static_chrome()
+        self._chrome_layer = None
+        self._chrome_key = None
+
+        # Pens and fonts are made once rather than on every paint
+        self._outline_pen = QPen(QColor(100, 100, 100, 200), 2, Qt.SolidLine,
+                                 Qt.RoundCap, Qt.RoundJoin)
+        self._highlight_pen = QPen(QColor(100, 100, 255, 170), 6, Qt.SolidLine,
+                                   Qt.RoundCap, Qt.RoundJoin)
+        self._label_font = QFont()
+        self._label_font.setPointSize(8)
+        self._label_metrics = QFontMetrics(self._label_font)
+        self._stats_color = QColor(160, 150, 150, 200)
+
+        # Set by the GUI; see controllers.renderscheduler
+        self.scheduler = None
+
         self.windowChanged.connect(self.on_window_changed)
+        self.model.changed.connect(self.request_repaint)
+        self.selection_changed.connect(self.request_repaint)
 
     selection_changed = pyqtSignal()
     model_changed = pyqtSignal()
@@ -102,62 +129,7 @@ class CanvasView(QQuickPaintedItem):
             print("No opengl context")
             return
 
-        vertex_shader = '''
-#version 120
-attribute highp vec4 posAttr;
-attribute lowp vec4 colAttr;
-varying lowp vec4 col;
-
-void main() {
-    col = colAttr;
-    gl_Position = posAttr;
-}
- '''
-
-        fragment_shader = '''
-#version 120
-
-vec4 blur5(sampler2D image, vec2 uv, vec2 resolution, vec2 direction) {
-    vec4 color = vec4(0.0);
-    vec2 off1 = vec2(1.3333333333333333) * direction;
-    color += texture2D(image, uv) * 0.29411764705882354;
-    color += texture2D(image, uv + (off1 / resolution)) * 0.35294117647058826;
-    color += texture2D(image, uv - (off1 / resolution)) * 0.35294117647058826;
-    return color;
-}
-
-void main (void)
-{
-    gl_FragColor = vec4(0, 0, 0, 0);
-}
-'''
-
-        self.program = QOpenGLShaderProgram(self)
-
-        self.program.addShaderFromSourceCode(QOpenGLShader.Vertex,
-                vertex_shader)
-
-        self.program.addShaderFromSourceCode(QOpenGLShader.Fragment,
-                fragment_shader)
-
-        self.program.link()
-
-        self.pos_attr = self.program.attributeLocation('posAttr')
-
-        self.vertices = np.array([
-                 0.0,  0.707,
-                -0.5, -0.5,
-                 0.5, -0.5
-            ], dtype=np.float32)
-
-        self.buf = QOpenGLBuffer()
-        self.buf.create()
-        self.buf.bind()
-        self.buf.setUsagePattern(QOpenGLBuffer.StaticDraw)
-        self.buf.allocate(self.vertices, self.vertices.nbytes)
-
-        self.buf.release()
-
+        self.renderer = CanvasRenderer(self.gl, self)
 
     def scene_to_canvas(self, coord):
         """
@@ -183,9 +155,42 @@ void main (void)
         scaled = (coord[0] * scale, coord[1] * scale)
         return scaled
 
+    def pixel_positions(self):
+        """
+        Returns a contiguous (N, 2) float32 array of canvas-space pixel
+        locations, in the order of Scene.get_pixel_group_locations().
+        The array is cached until the scene geometry or extents change or the
+        window is resized, and must not be modified.
+        """
+        scene = self.model.scene
+        key = (scene.geometry_version, scene.extents, self.window().width(),
+               self.window().height())
+        if key != self._positions_key:
+            canvas_width, canvas_height = scene.extents
+            scale = min(self.window().width() / canvas_width,
+                        self.window().height() / canvas_height)
+            self._pixel_positions = (scene.get_pixel_group_locations() *
+                                     np.float32(scale))
+            self._positions_key = key
+        return self._pixel_positions
+
+    @pyqtSlot()
+    def request_repaint(self):
+        if self.scheduler is not None:
+            self.scheduler.request()
+        else:
+            self.update()
+
     def paint(self, painter):
+        start = time.perf_counter()
+        with timings.span("paint"):
+            self._paint(painter)
+        if self.scheduler is not None:
+            self.scheduler.painted(time.perf_counter() - start)
 
-        start = time.time()
+    def _paint(self, painter):
+        # In coalescing mode, this is where the newest network frame is taken
+        self.gui.netcontroller.flush_frame()
 
         painter.setRenderHint(QPainter.SmoothPixmapTransform)
 
@@ -216,13 +221,6 @@ void main (void)
                 h = int(self.height() * ratio)
 
                 gl.glViewport(0, 0, w, h)
-                gl.glMatrixMode(gl.GL_PROJECTION)
-                gl.glLoadIdentity()
-
-                gl.glOrtho(0, w, h, 0, -10, 10)
-
-                gl.glMatrixMode(gl.GL_MODELVIEW)
-                gl.glLoadIdentity()
 
                 gl.glEnable(gl.GL_SCISSOR_TEST)
                 gl.glScissor(0, 0, w, h)
@@ -231,56 +229,84 @@ void main (void)
                     gl.glClearColor(0, 0, 0, 1)
                     gl.glClear(gl.GL_COLOR_BUFFER_BIT)
 
-                size = self.scene_to_canvas((10, 10))[0]
-                gl.glPointSize(3 * size if self.model.blurred else size)
-
-                gl.glBegin(gl.GL_POINTS)
-
-                for pg in self.model.scene.pixel_groups:
-                    if type(pg) == LinearPixelGroup:
-                        colors = self.model.color_data.get(pg.strand, None)
-                        if colors is None:
-                            continue
-
-                        colors = colors[pg.offset:pg.offset + pg.count]
-
-                        x1, y1 = self.scene_to_canvas(pg.start)
-                        x2, y2 = self.scene_to_canvas(pg.end)
-
-                        y1 = self.height() - y1
-                        y2 = self.height() - y2
-                        dx = (x2 - x1) / pg.count
-                        dy = (y2 - y1) / pg.count
+                with timings.span("upload"):
+                    positions = self.pixel_positions()
+                    if positions is not self._uploaded_positions:
+                        self.renderer.set_positions(positions)
+                        self._uploaded_positions = positions
+                        self._pixel_colors = np.zeros((len(positions), 4),
+                                                      dtype=np.uint8)
+                    self.model.update_color_buffer()
+                    self.renderer.set_colors(
+                        self.model.gather_render_colors(self._pixel_colors))
+
+                # Canvas space is y-down; flip it into the GL viewport
+                matrix = QMatrix4x4()
+                matrix.ortho(0, w, h, 0, -10, 10)
+                matrix.translate(0, self.height())
+                matrix.scale(1, -1)
 
-                        x, y = x1, y1
-                        for r, g, b in colors:
-                            gl.glColor4f(r / 255, g / 255, b / 255, 1)
-                            gl.glVertex2f(x, y)
-
-                            x += dx
-                            y += dy
-
-                gl.glEnd()
+                size = self.scene_to_canvas((10, 10))[0]
+                with timings.span("draw"):
+                    self.renderer.draw(matrix,
+                                       3 * size if self.model.blurred else size)
 
                 gl.glDisable(gl.GL_SCISSOR_TEST)
 
                 painter.endNativePainting()
+
+                self.gui.netcontroller.frame_painted()
             else:
                 if self.window().openglContext() is not None:
                     self.init_opengl()
 
-        painter.setRenderHint(QPainter.Antialiasing)
-
-        selected = [pg for pg in self.model.scene.pixel_groups
-                    if pg.selected or pg.hovering]
-        s = set(selected)
-        unselected = [pg for pg in self.model.scene.pixel_groups if pg not in s]
+        with timings.span("chrome"):
+            self._paint_chrome(painter)
 
-        for pg in unselected:
-            self.painters[pg.__class__](self, painter, pg)
+    def _static_chrome(self, active):
+        """
+        Returns an image of the chrome of every pixel group not in `active`
+        (the selected and hovered groups, which are drawn on top each paint).
+        It is only redrawn when the geometry, addressing, scene extents (which
+        set the scene-to-canvas scale), window size or set of active groups
+        changes.
+        """
+        scene = self.model.scene
+        ratio = self.window().devicePixelRatio()
+        width, height = self.window().width(), self.window().height()
+        key = (scene.geometry_version, scene.address_version, scene.extents,
+               width, height, ratio, frozenset(id(pg) for pg in active))
+        if key != self._chrome_key:
+            layer = QImage(int(width * ratio), int(height * ratio),
+                           QImage.Format_ARGB32_Premultiplied)
+            layer.setDevicePixelRatio(ratio)
+            layer.fill(Qt.transparent)
+
+            layer_painter = QPainter(layer)
+            layer_painter.setRenderHint(QPainter.Antialiasing)
+            skip = set(active)
+            for pg in scene.pixel_groups:
+                if pg not in skip:
+                    self.painters[pg.__class__](self, layer_painter, pg)
+            layer_painter.end()
+
+            self._chrome_layer = layer
+            self._chrome_key = key
+        return self._chrome_layer
+
+    def _paint_chrome(self, painter):
+        painter.setRenderHint(QPainter.Antialiasing)
 
-        for pg in selected:
-            self.painters[pg.__class__](self, painter, pg)
+        # Pixel groups only have chrome in design mode
+        if self.model.design_mode:
+            active = [pg for pg in self.model.scene.pixel_groups
+                      if pg.selected or pg.hovering]
+            painter.drawImage(QPoint(0, 0), self._static_chrome(active))
+            for pg in active:
+                self.painters[pg.__class__](self, painter, pg)
+        else:
+            self._chrome_layer = None
+            self._chrome_key = None
 
         self._render_pixels_this_frame = False
 
@@ -301,25 +327,22 @@ void main (void)
             self._fps = 0 if delta == 0 else (self._frame_count / delta)
             self._frame_count = 0
             self._frame_time = time.perf_counter()
-
-            # Auto throttle
-            if self._fps < self.gui.target_fps - 10:
-                self._fps_below_target += 1
-                if self._fps_below_target > 10:
-                    new_target = max(self.gui.target_fps - 10, 10)
-                    log.warn("FPS target not met; lowering to %d" % new_target)
-                    self.update_target_fps.emit(new_target)
-                    self._fps_below_target = 0
+            self._timing_lines = timings.overlay_lines()
 
         # Stats
-        f = QFont()
-        f.setPointSize(8)
-        painter.setFont(f)
-        painter.setPen(QColor(160, 150, 150, 200))
+        painter.setFont(self._label_font)
+        painter.setPen(self._stats_color)
         painter.drawText(8, 16, "Net %d pps / %d fps" %
                          (self.gui.netcontroller.pps,
                           self.gui.netcontroller.fps))
-        painter.drawText(8, 32, "GUI %d fps" % self._fps)
+        painter.drawText(8, 32, "GUI %d fps (max %d)" %
+                         (self._fps, self.scheduler.target_fps
+                          if self.scheduler is not None else 0))
+
+        # Rolling mean / p90 / max of each stage, updated once a second
+        painter.setFont(self._timing_font)
+        for i, line in enumerate(self._timing_lines):
+            painter.drawText(8, 48 + 12 * i, line)
 
     def _paint_linear_pixel_group(self, painter, pg):
         x1, y1 = self.scene_to_canvas(pg.start)
@@ -335,18 +358,10 @@ void main (void)
             #     self._draw_bounding_box(painter, pg, c)
 
             if pg.selected or pg.hovering:
-                painter.setPen(QPen(QColor(100, 100, 255, 170),
-                                          6,
-                                          Qt.SolidLine,
-                                          Qt.RoundCap,
-                                          Qt.RoundJoin))
+                painter.setPen(self._highlight_pen)
                 painter.drawLine(QPointF(x1, y1),QPointF(x2, y2))
 
-            painter.setPen(QPen(QColor(100, 100, 100, 200),
-                                      2,
-                                      Qt.SolidLine,
-                                      Qt.RoundCap,
-                                      Qt.RoundJoin))
+            painter.setPen(self._outline_pen)
             painter.drawLine(QPointF(x1, y1),QPointF(x2, y2))
 
             if pg.selected:
@@ -386,13 +401,10 @@ void main (void)
         painter.drawRoundedRect(rect, 2, 2)
 
         label_pos = QPoint(x + 15, y + 15)
-        label_font = QFont()
-        label_font.setPointSize(8)
-        painter.setFont(label_font)
+        painter.setFont(self._label_font)
 
         label_string = "Start" if (handle == handle.parent.start_handle) else "End"
-        fm = QFontMetrics(label_font)
-        text_rect = fm.boundingRect(label_string)
+        text_rect = self._label_metrics.boundingRect(label_string)
         text_rect += QMargins(5, 2, 5, 2)
         label_rect = QRect(label_pos - QPoint(12, 7), text_rect.size())
         painter.setBrush(QColor(128, 64, 128, 150))
@@ -404,15 +416,12 @@ void main (void)
     def _draw_address(self, painter, pg, offset):
         x1, y1 = self.scene_to_canvas(pg.start)
         x2, y2 = self.scene_to_canvas(pg.end)
-        label_pos = QPoint((x1 + x2) / 2 + offset[0], (y1 + y2) / 2 + offset[1])
+        label_pos = QPoint((x1 + x2) // 2 + offset[0], (y1 + y2) // 2 + offset[1])
 
-        label_font = QFont()
-        label_font.setPointSize(8)
-        painter.setFont(label_font)
+        painter.setFont(self._label_font)
 
         label_string = "%d:%d" % (pg.strand, pg.offset)
-        fm = QFontMetrics(label_font)
-        text_rect = fm.boundingRect(label_string)
+        text_rect = self._label_metrics.boundingRect(label_string)
         text_rect += QMargins(5, 2, 5, 2)
         label_rect = QRect(label_pos - QPoint(12, 7), text_rect.size())
 
@@ -422,32 +431,35 @@ void main (void)
         painter.setPen(QColor(255, 255, 255, 255))
         painter.drawText(label_rect, Qt.AlignCenter, label_string)
 
+    # Hover, drag and selection state live in the scene's pixel groups and
+    # handles, so any input may change what is drawn
+
     def hoverMoveEvent(self, event):
         self.controller.on_hover_move(event)
+        self.request_repaint()
 
     def mouseMoveEvent(self, event):
         self.controller.on_mouse_move(event)
+        self.request_repaint()
 
     def mousePressEvent(self, event):
         self.controller.on_mouse_press(event)
+        self.request_repaint()
 
     def mouseReleaseEvent(self, event):
         self.controller.on_mouse_release(event)
+        self.request_repaint()
 
     def keyPressEvent(self, event):
         event.accept()
         self.controller.on_key_press(event)
+        self.request_repaint()
 
     def keyReleaseEvent(self, event):
         event.accept()
-        self.controller.on_key_release(event)
-
-
-class CanvasRenderer(QObject):
-
-    def __init__(self):
-        super(QObject, self).__init__()
+        if event.key() == Qt.Key_F12:
+            self.gui.dump_timings()
+        else:
+            self.controller.on_key_release(event)
+        self.request_repaint()
 
-    @pyqtSlot()
-    def paint(self):
-        gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)